@@ -0,0 +1,105 @@
+"""
+Measure the throughput of the MQTT bridge with the in-memory client.
+
+Two numbers are reported: the publish path alone (state updates diffed,
+coalesced and published per second) and the bridge polling stand-in units,
+which run in their own process. Run from the repository root:
+
+    $ python benchmarks/mqtt.py --units 500
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import time
+
+from yarl import URL
+
+from dingz.fleet import DingzFleet, StateUpdate
+from dingz.mqtt import InMemoryClient, MqttBridge
+from dingz.snapshot import StateSnapshot
+from standin import SHADE, STATE, serve
+
+HOST = "127.0.0.1"
+
+
+async def measure_publish(units: int, updates: int) -> None:
+    """Feed prepared state updates to the bridge, print the updates and messages per second."""
+    snapshots = [
+        StateSnapshot.from_json(
+            dict(STATE, sensors=dict(STATE["sensors"], room_temperature=round(18 + index / 100, 2))),
+            SHADE.values(),
+        )
+        for index in range(1000)
+    ]
+    client = InMemoryClient()
+    bridge = MqttBridge(DingzFleet([]), client)
+
+    started = time.perf_counter()
+    for index in range(updates):
+        bridge.consume(StateUpdate(f"unit{index % units}", random.choice(snapshots), None))
+        if index % units == units - 1:
+            await bridge.flush()
+    await bridge.flush()
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"publish path {updates / elapsed:8.0f} updates/s "
+        f"{bridge.messages_published / elapsed:8.0f} messages/s"
+    )
+
+
+async def measure_polling(units: int, port: int, duration: float) -> None:
+    """Run the bridge against the stand-in units, print the updates and messages per second."""
+    hosts = [f"unit{index}" for index in range(units)]
+    async with DingzFleet(hosts, concurrency=100) as fleet:
+        for host in hosts:
+            fleet.get(host).uri = URL(f"http://{HOST}:{port}/api/v1/")
+        client = InMemoryClient()
+        bridge = MqttBridge(fleet, client, interval=0, batch_interval=0.5)
+
+        received = 0
+        consume = bridge.consume
+
+        def count(update):
+            nonlocal received
+            received += 1
+            consume(update)
+
+        bridge.consume = count
+        task = asyncio.ensure_future(bridge.run())
+        await asyncio.sleep(1)
+        received, published = 0, bridge.messages_published
+        started = time.perf_counter()
+        await asyncio.sleep(duration)
+        elapsed = time.perf_counter() - started
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    print(
+        f"polling      {received / elapsed:8.0f} updates/s "
+        f"{(bridge.messages_published - published) / elapsed:8.0f} messages/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--units", type=int, default=500)
+    parser.add_argument("--updates", type=int, default=50000)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--port", type=int, default=18081)
+    args = parser.parse_args()
+
+    asyncio.run(measure_publish(args.units, args.updates))
+
+    server = multiprocessing.Process(target=serve, args=(HOST, args.port, True), daemon=True)
+    server.start()
+    time.sleep(1)
+    try:
+        asyncio.run(measure_polling(args.units, args.port, args.duration))
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Measure how the multi-process poller scales with the number of worker processes.
+
+Every simulated unit is a loopback address (127.0.x.y) answered by a pool of
+stand-in servers listening on port 80, the port the client uses. This needs
+Linux, where all of 127.0.0.0/8 is routed to the loopback interface, and the
+permission to bind port 80. Run from the repository root:
+
+    $ python benchmarks/poller.py --units 1000 --processes 1 2 4
+
+Give the stand-in servers their own cores, or the servers and the workers
+compete for the same CPUs and the scaling is not visible.
+"""
+import argparse
+import multiprocessing
+import time
+
+from dingz.poller import MultiProcessPoller
+from standin import serve
+
+
+def measure(hosts, processes: int, duration: float, warm_up: int) -> float:
+    """Return the deltas per second received from the workers."""
+    with MultiProcessPoller(
+        hosts, processes=processes, interval=0, concurrency=100, batch_interval=0.2
+    ) as poller:
+        received, started = 0, None
+        deadline = time.perf_counter() + duration
+        for _ in poller.deltas(timeout=5):
+            received += 1
+            if received == warm_up:
+                started = time.perf_counter()
+            if time.perf_counter() > deadline:
+                break
+    if started is None:
+        raise RuntimeError("Not enough deltas received, are the stand-in servers running?")
+    return (received - warm_up) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--units", type=int, default=1000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--servers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--duration", type=float, default=8)
+    args = parser.parse_args()
+
+    servers = [
+        multiprocessing.Process(target=serve, args=("0.0.0.0", 80, True, True), daemon=True)
+        for _ in range(args.servers)
+    ]
+    for server in servers:
+        server.start()
+    time.sleep(1.5)
+
+    hosts = ["127.0.%d.%d" % (index // 250, index % 250 + 1) for index in range(args.units)]
+    try:
+        print(f"{multiprocessing.cpu_count()} CPUs, {args.servers} stand-in servers")
+        for processes in args.processes:
+            rate = measure(hosts, processes, args.duration, warm_up=min(2000, args.units * 2))
+            print(f"{processes} processes: {rate:8.0f} deltas/s")
+    finally:
+        for server in servers:
+            server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Stand-in dingz unit for the benchmarks."""
+import asyncio
+import random
+
+from aiohttp import web
+
+STATE = {
+    "sensors": {
+        "brightness": 120.5,
+        "light_state": "day",
+        "room_temperature": 21.37,
+        "person_present": 1,
+    },
+    "dimmers": [
+        {
+            "on": True,
+            "output": 50,
+            "ramp": 0,
+            "readonly": False,
+            "index": {"relative": index, "absolute": index},
+        }
+        for index in range(4)
+    ],
+    "blinds": [
+        {
+            "moving": "stop",
+            "position": 40,
+            "lamella": 10,
+            "readonly": False,
+            "index": {"relative": index, "absolute": index},
+        }
+        for index in range(2)
+    ],
+}
+
+SHADE = {
+    str(index): {
+        "target": {"blind": 40, "lamella": 10},
+        "current": {"blind": 40, "lamella": 10},
+        "disabled": False,
+        "index": {"relative": index, "absolute": index},
+    }
+    for index in range(2)
+}
+
+
+def make_app(changing: bool = False) -> web.Application:
+    """Return the application of a unit, with ``changing`` the temperature changes every poll."""
+
+    async def state(request):
+        if not changing:
+            return web.json_response(STATE)
+        sensors = dict(STATE["sensors"], room_temperature=round(random.uniform(18, 25), 2))
+        return web.json_response(dict(STATE, sensors=sensors))
+
+    async def shade(request):
+        return web.json_response(SHADE)
+
+    async def info(request):
+        return web.json_response({"version": "1.4.0", "mac": "AABBCCDDEEFF", "type": 108})
+
+    async def temperature(request):
+        return web.json_response({"success": True, "temperature": 21.37})
+
+    app = web.Application()
+    app.router.add_get("/api/v1/state", state)
+    app.router.add_get("/api/v1/shade", shade)
+    app.router.add_get("/api/v1/info", info)
+    app.router.add_get("/api/v1/temp", temperature)
+    return app
+
+
+def serve(host: str, port: int, changing: bool = False, reuse_port: bool = False) -> None:
+    """Serve a unit until the process is terminated, run in a separate process."""
+
+    async def run():
+        runner = web.AppRunner(make_app(changing), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port, reuse_port=reuse_port).start()
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
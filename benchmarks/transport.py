@@ -0,0 +1,68 @@
+"""
+Compare the aiohttp and the asyncio streams transport.
+
+The stand-in unit runs in its own process, so the CPU time measured is the
+one of the client only. Run from the repository root:
+
+    $ python benchmarks/transport.py --requests 6000
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+
+from yarl import URL
+
+from dingz.dingz import Dingz
+from dingz.transport import AiohttpTransport, StreamTransport
+from standin import serve
+
+HOST = "127.0.0.1"
+
+
+async def measure(transport_class, port: int, requests: int, concurrency: int):
+    """Return the requests per second and the client CPU time per request."""
+    transport = transport_class()
+    dingz = Dingz(HOST, transport=transport)
+    dingz.uri = URL(f"http://{HOST}:{port}/api/v1/")
+    await dingz.get_info()
+
+    async def worker():
+        for _ in range(requests // concurrency // 2):
+            await dingz.get_info()
+            await dingz.get_temperature()
+
+    started, cpu_started = time.perf_counter(), time.process_time()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    sent = requests // concurrency // 2 * 2 * concurrency
+
+    await transport.close()
+    await dingz.close()
+    return sent / wall, cpu / sent * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=6000)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--port", type=int, default=18080)
+    args = parser.parse_args()
+
+    server = multiprocessing.Process(target=serve, args=(HOST, args.port), daemon=True)
+    server.start()
+    time.sleep(1)
+    try:
+        for _ in range(args.rounds):
+            for name, transport_class in (("aiohttp", AiohttpTransport), ("stream", StreamTransport)):
+                rate, cpu = asyncio.run(
+                    measure(transport_class, args.port, args.requests, args.concurrency)
+                )
+                print(f"{name:8s} {rate:8.0f} requests/s {cpu:7.1f} us client CPU/request")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
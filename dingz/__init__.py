@@ -1,13 +1,40 @@
 """Base details for the dingz Python bindings."""
 import asyncio
+import contextvars
+import json
 import socket
-from typing import Any, Mapping, Optional
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Hashable, Mapping, Optional, Tuple
 
 import aiohttp
 import async_timeout
 
-from .constants import TIMEOUT, USER_AGENT, CONTENT_TYPE_JSON, CONTENT_TYPE, CONTENT_TYPE_TEXT_PLAIN
-from .exceptions import DingzConnectionError
+from .constants import (
+    CHUNK_SIZE,
+    CONTENT_TYPE_JSON,
+    CONTENT_TYPE_TEXT_PLAIN,
+    TIMEOUT,
+    USER_AGENT,
+)
+from .exceptions import DingzConnectionError, DingzResponseError
+from .profiling import (
+    PHASE_CALL,
+    PHASE_DECODE,
+    PHASE_RATE_LIMIT,
+    PHASE_REQUEST,
+    active_profiler,
+    phase,
+    trace_config,
+)
+from .scheduler import PRIORITY_COMMAND, PRIORITY_STATE
+from .transport import AiohttpTransport, Transport
+
+
+# Collects the body sizes of the responses received in the current context
+_RESPONSE_SIZES: contextvars.ContextVar = contextvars.ContextVar(
+    "dingz_response_sizes", default=None
+)
 
 
 async def make_call(
@@ -18,9 +45,209 @@ async def make_call(
     json_data: Optional[dict] = None,
     parameters: Optional[Mapping[str, str]] = None,
     token: str = None,
+    priority: Optional[int] = None,
 ) -> Any:
-    """Handle the requests to the dingz unit."""
+    """
+    Handle the requests to the dingz unit.
+
+    Concurrent identical GET requests share a single request and its result.
+    """
+    with phase(PHASE_CALL):
+        return await _make_call(self, uri, method, data, json_data, parameters, token, priority)
+
+
+async def _make_call(
+    self,
+    uri: str,
+    method: str,
+    data: Optional[Any],
+    json_data: Optional[dict],
+    parameters: Optional[Mapping[str, str]],
+    token: Optional[str],
+    priority: Optional[int],
+) -> Any:
+    """Share concurrent identical GET requests, schedule all others."""
+    pending_calls = getattr(self, "_pending_calls", None)
+    if method != "GET" or pending_calls is None:
+        return await _schedule(self, uri, method, data, json_data, parameters, token, priority)
+
+    key = (str(uri), tuple(sorted(parameters.items())) if parameters else None, token)
+    pending = pending_calls.get(key)
+    if pending is None:
+        pending = asyncio.ensure_future(
+            _schedule(self, uri, method, data, json_data, parameters, token, priority)
+        )
+        pending_calls[key] = pending
+        pending.add_done_callback(partial(_forget_call, pending_calls, key))
+
+    return await asyncio.shield(pending)
+
+
+async def _measured_call(self, uri: str) -> Tuple[Any, int]:
+    """Send a GET request, not shared with others, return the result and the body size."""
+    sizes = []
+    token = _RESPONSE_SIZES.set(sizes)
+    try:
+        result = await _schedule(self, uri, "GET", None, None, None, None, None)
+    finally:
+        _RESPONSE_SIZES.reset(token)
+    return result, sum(sizes)
+
+
+def _forget_call(pending_calls: dict, key: Hashable, pending: asyncio.Future) -> None:
+    """Remove a finished request from the shared requests."""
+    if pending_calls.get(key) is pending:
+        del pending_calls[key]
+    if not pending.cancelled():
+        # All callers may have been cancelled, don't warn about the result
+        pending.exception()
+
+
+async def _schedule(
+    self,
+    uri: str,
+    method: str,
+    data: Optional[Any],
+    json_data: Optional[dict],
+    parameters: Optional[Mapping[str, str]],
+    token: Optional[str],
+    priority: Optional[int],
+) -> Any:
+    """Pass the request to the scheduler of the dingz unit."""
+    if priority is None:
+        priority = PRIORITY_STATE if method == "GET" else PRIORITY_COMMAND
+
+    # The token is taken before a slot, throttled requests must not block the slots
+    with phase(PHASE_RATE_LIMIT):
+        await _acquire_rate_limit(self, priority)
+
+    scheduler = getattr(self, "_scheduler", None)
+    if scheduler is None:
+        return await _request(self, uri, method, data, json_data, parameters, token)
+
+    return await scheduler.submit(
+        lambda: _request(self, uri, method, data, json_data, parameters, token),
+        priority=priority,
+    )
+
+
+async def _request(
+    self,
+    uri: str,
+    method: str,
+    data: Optional[Any],
+    json_data: Optional[dict],
+    parameters: Optional[Mapping[str, str]],
+    token: Optional[str],
+) -> Any:
+    """Send a single request to the dingz unit."""
+    try:
+        with phase(PHASE_REQUEST), async_timeout.timeout(TIMEOUT):
+            response = await _get_transport(self).request(
+                method, uri, _headers(token), data=data, json_data=json_data, params=parameters,
+            )
+    except asyncio.TimeoutError as exception:
+        raise DingzConnectionError("Timeout occurred while connecting to dingz unit") from exception
+    except (aiohttp.ClientError, OSError, asyncio.IncompleteReadError) as exception:
+        raise DingzConnectionError("Error occurred while communicating with dingz") from exception
 
+    if response.status >= 400:
+        raise DingzResponseError("Unexpected response status %s from dingz" % response.status)
+
+    sizes = _RESPONSE_SIZES.get()
+    if sizes is not None:
+        sizes.append(len(response.body))
+
+    with phase(PHASE_DECODE):
+        if CONTENT_TYPE_JSON in response.content_type:
+            try:
+                return json.loads(response.body)
+            except ValueError as exception:
+                raise DingzResponseError("Invalid JSON response from dingz") from exception
+
+        return response.body.decode("utf-8", errors="replace")
+
+
+async def stream_call(
+    self,
+    uri: str,
+    method: str = "GET",
+    data: Optional[Any] = None,
+    headers: Optional[Mapping[str, str]] = None,
+    token: str = None,
+    chunk_size: int = CHUNK_SIZE,
+    timeout: int = TIMEOUT,
+    priority: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Stream the body of the response from the dingz unit in chunks.
+
+    The request body may be an async iterable, so neither the request nor the
+    response is held in memory as a whole. ``timeout`` covers sending the
+    request until the response headers arrive. The request holds a slot of
+    the scheduler of the unit until the stream is closed.
+
+    Transports return complete responses, so streamed requests are sent with
+    the session of the unit: they are neither recorded nor replayed.
+    """
+    if priority is None:
+        priority = PRIORITY_STATE if method == "GET" else PRIORITY_COMMAND
+    with phase(PHASE_RATE_LIMIT):
+        await _acquire_rate_limit(self, priority)
+    request_headers = _headers(token)
+    if headers:
+        request_headers.update(headers)
+
+    async with _slot(self, priority):
+        try:
+            with async_timeout.timeout(timeout):
+                response = await _get_session(self).request(
+                    method, uri, data=data, headers=request_headers
+                )
+        except asyncio.TimeoutError as exception:
+            raise DingzConnectionError(
+                "Timeout occurred while connecting to dingz unit"
+            ) from exception
+        except (aiohttp.ClientError, socket.gaierror) as exception:
+            raise DingzConnectionError(
+                "Error occurred while communicating with dingz"
+            ) from exception
+
+        if response.status >= 400:
+            response.release()
+            raise DingzResponseError("Unexpected response status %s from dingz" % response.status)
+
+        try:
+            async for chunk in response.content.iter_chunked(chunk_size):
+                yield chunk
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exception:
+            raise DingzConnectionError(
+                "Error occurred while communicating with dingz"
+            ) from exception
+        finally:
+            response.release()
+
+
+@asynccontextmanager
+async def _slot(self, priority: int) -> AsyncIterator[None]:
+    """Hold a slot of the scheduler of the dingz unit, if it has one."""
+    scheduler = getattr(self, "_scheduler", None)
+    if scheduler is None:
+        yield
+    else:
+        async with scheduler.slot(priority):
+            yield
+
+
+async def _acquire_rate_limit(self, priority: int = PRIORITY_STATE) -> None:
+    """Wait for the rate limiter of the dingz unit, if it has one."""
+    rate_limiter = getattr(self, "_rate_limiter", None)
+    if rate_limiter is not None:
+        await rate_limiter.acquire(priority)
+
+
+def _headers(token: Optional[str]) -> dict:
+    """Return the headers sent with every request."""
     headers = {
         "User-Agent": USER_AGENT,
         "Accept": f"{CONTENT_TYPE_JSON}, {CONTENT_TYPE_TEXT_PLAIN}, */*",
@@ -29,22 +256,24 @@ async def make_call(
     if token:
         headers["Authorization"] = f"Bearer {token}"
 
-    if self._session is None:
-        self._session = aiohttp.ClientSession()
-        self._close_session = True
+    return headers
 
-    try:
-        with async_timeout.timeout(TIMEOUT):
-            response = await self._session.request(
-                method, uri, data=data, json=json_data, params=parameters, headers=headers,
-            )
-    except asyncio.TimeoutError as exception:
-        raise DingzConnectionError("Timeout occurred while connecting to dingz unit") from exception
-    except (aiohttp.ClientError, socket.gaierror) as exception:
-        raise DingzConnectionError("Error occurred while communicating with dingz") from exception
 
-    if CONTENT_TYPE_JSON in response.headers.get(CONTENT_TYPE, ""):
-        response_json = await response.json()
-        return response_json
+def _get_transport(self) -> Transport:
+    """Return the transport of the dingz unit, by default one using its session."""
+    if getattr(self, "_transport", None) is None:
+        self._transport = AiohttpTransport(_get_session(self))
+        self._close_transport = True
+
+    return self._transport
+
+
+def _get_session(self) -> aiohttp.ClientSession:
+    """Return the session of the dingz unit, create one if needed."""
+    if self._session is None:
+        # Report DNS and connect times if created while profiling
+        trace_configs = [trace_config()] if active_profiler() is not None else None
+        self._session = aiohttp.ClientSession(trace_configs=trace_configs)
+        self._close_session = True
 
-    return response.text
+    return self._session
@@ -0,0 +1,203 @@
+"""Back up and restore the configuration of many dingz units."""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from yarl import URL
+
+from . import make_call
+from .constants import (
+    BLIND_CONFIGURATION,
+    DIMMER_CONFIGURATION,
+    INPUT_CONFIGURATION,
+    PIR_CONFIGURATION,
+    SETTINGS,
+    SYSTEM_CONFIG,
+    THERMOSTAT_CONFIGURATION,
+)
+from .dingz import Dingz
+from .fleet import DingzFleet
+from .scheduler import PRIORITY_CONFIG
+
+_LOGGER = logging.getLogger(__name__)
+
+CONFIG_SECTIONS = (
+    PIR_CONFIGURATION,
+    THERMOSTAT_CONFIGURATION,
+    INPUT_CONFIGURATION,
+    BLIND_CONFIGURATION,
+    DIMMER_CONFIGURATION,
+    SYSTEM_CONFIG,
+    SETTINGS,
+)
+
+# Sections holding per-unit fields (name, network, ...), not applied to many units by default
+PER_UNIT_SECTIONS = (SYSTEM_CONFIG, SETTINGS)
+
+# Manifest of a snapshot: host -> configuration section -> digest
+Manifest = Dict[str, Dict[str, str]]
+
+
+def canonical_json(value: Any) -> bytes:
+    """Return the JSON representation used for hashing and storing a section."""
+    return json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def digest(value: Any) -> str:
+    """Return the content address of a configuration section."""
+    return hashlib.sha256(canonical_json(value)).hexdigest()
+
+
+class ConfigStore(object):
+    """
+    Content-addressed store for configuration sections.
+
+    Every distinct section is stored once under its SHA-256 digest, so the
+    identical configuration of hundreds of units only takes the space of one.
+    Snapshots are manifests referencing the sections by digest.
+
+    Layout: ``objects/<ab>/<digest>.json`` and ``snapshots/<name>.json``.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize the store in the directory ``path``."""
+        self.path = path
+        os.makedirs(os.path.join(path, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(path, "snapshots"), exist_ok=True)
+
+    def _object_path(self, key: str) -> str:
+        return os.path.join(self.path, "objects", key[:2], f"{key}.json")
+
+    def put(self, value: Any) -> str:
+        """Store a section unless already present and return its digest."""
+        key = digest(value)
+        path = self._object_path(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f"{path}.tmp", "wb") as section_file:
+                section_file.write(canonical_json(value))
+            os.replace(f"{path}.tmp", path)
+        return key
+
+    def get(self, key: str) -> Any:
+        """Return the section stored under ``key``."""
+        with open(self._object_path(key), "rb") as section_file:
+            return json.load(section_file)
+
+    def save_manifest(self, name: str, manifest: Manifest) -> None:
+        """Store the manifest of a snapshot."""
+        path = os.path.join(self.path, "snapshots", f"{name}.json")
+        with open(path, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, sort_keys=True, indent=2)
+
+    def load_manifest(self, name: str) -> Manifest:
+        """Return the manifest of a snapshot."""
+        path = os.path.join(self.path, "snapshots", f"{name}.json")
+        with open(path, encoding="utf-8") as manifest_file:
+            return json.load(manifest_file)
+
+
+async def fetch_sections(dingz: Dingz, sections: Iterable[str] = CONFIG_SECTIONS) -> Dict[str, Any]:
+    """Return the configuration sections of a unit."""
+    sections = list(sections)
+    values = await asyncio.gather(
+        *(
+            make_call(dingz, uri=URL(dingz.uri).join(URL(section)), priority=PRIORITY_CONFIG)
+            for section in sections
+        )
+    )
+    return dict(zip(sections, values))
+
+
+async def snapshot_fleet(
+    fleet: DingzFleet,
+    store: ConfigStore,
+    name: Optional[str] = None,
+    sections: Iterable[str] = CONFIG_SECTIONS,
+) -> Tuple[Manifest, Dict[str, Exception]]:
+    """
+    Store the configuration of all units of a fleet.
+
+    :param name: save the manifest under this name
+    :return: the manifest and the exception per unit that failed
+    """
+    sections = list(sections)
+    results = await fleet.run(lambda dingz: fetch_sections(dingz, sections))
+
+    manifest: Manifest = {}
+    failures = {}
+    for host, result in results.items():
+        if isinstance(result, BaseException):
+            _LOGGER.warning("Could not back up %s: %s", host, result)
+            failures[host] = result
+            continue
+        manifest[host] = {section: store.put(value) for section, value in result.items()}
+
+    if name is not None:
+        store.save_manifest(name, manifest)
+    return manifest, failures
+
+
+async def push_sections(
+    dingz: Dingz, store: ConfigStore, desired: Dict[str, str], dry_run: bool = False
+) -> list:
+    """
+    Write the sections of a unit that differ from the desired digests.
+
+    :return: the sections which differ
+    """
+    current = await fetch_sections(dingz, desired)
+    changed = [section for section, key in desired.items() if digest(current[section]) != key]
+    if dry_run:
+        return changed
+
+    for section in changed:
+        _LOGGER.debug("Writing %s of %s", section, dingz.host)
+        url = URL(dingz.uri).join(URL(section))
+        await make_call(dingz, uri=url, method="POST", json_data=store.get(desired[section]))
+    return changed
+
+
+async def restore_fleet(
+    fleet: DingzFleet, store: ConfigStore, manifest: Manifest, dry_run: bool = False
+) -> Dict[str, Any]:
+    """
+    Restore the units of a fleet to a snapshot, only writing the sections that differ.
+
+    Units of the fleet missing in the manifest are left alone.
+
+    :return: the changed sections, or the raised exception, per host
+    """
+    hosts = [host for host in fleet.hosts if host in manifest]
+    return await fleet.run(
+        lambda dingz: push_sections(dingz, store, manifest[dingz.host], dry_run), hosts=hosts
+    )
+
+
+async def apply_config(
+    fleet: DingzFleet,
+    store: ConfigStore,
+    desired: Dict[str, str],
+    dry_run: bool = False,
+    include_per_unit: bool = False,
+) -> Dict[str, Any]:
+    """
+    Apply the same configuration sections, given by digest, to all units of a fleet.
+
+    The sections in ``PER_UNIT_SECTIONS`` hold fields like the name of a unit
+    and are left out, unless ``include_per_unit`` is set: all units would
+    then get the same values for these fields.
+
+    :return: the changed sections, or the raised exception, per host
+    """
+    if not include_per_unit:
+        skipped = [section for section in desired if section in PER_UNIT_SECTIONS]
+        if skipped:
+            _LOGGER.warning("Not applying the per-unit sections %s", ", ".join(skipped))
+        desired = {
+            section: key for section, key in desired.items() if section not in PER_UNIT_SECTIONS
+        }
+    return await fleet.run(lambda dingz: push_sections(dingz, store, desired, dry_run))
@@ -6,7 +6,11 @@ import click
 
 from dingz.dingz import Dingz
 
-from .discovery import discover_dingz_devices
+from .backup import ConfigStore, restore_fleet, snapshot_fleet
+from .constants import DISCOVERY_PORT
+from .discovery import discover_dingz_devices, probe_dingz_devices
+from .fleet import DingzFleet
+from .profiling import profile
 
 
 def coro(f):
@@ -15,23 +19,60 @@ def coro(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
         """Async wrapper."""
-        return asyncio.run(f(*args, **kwargs))
+        options = click.get_current_context().find_root().params
+        if not options.get("profile") and options.get("profile_output") is None:
+            return asyncio.run(f(*args, **kwargs))
+
+        async def profiled():
+            output = options.get("profile_output")
+            with profile(cprofile=output is not None) as profiler:
+                try:
+                    return await f(*args, **kwargs)
+                finally:
+                    click.echo(profiler.summary(), err=True)
+                    if output is not None:
+                        profiler.dump(output)
+
+        return asyncio.run(profiled())
 
     return wrapper
 
 
 @click.group()
 @click.version_option()
-def main():
+@click.option("--profile", is_flag=True, help="Print where the time of the requests goes.")
+@click.option(
+    "--profile-output", type=click.Path(dir_okay=False), help="Write a cProfile profile to a file.",
+)
+def main(profile, profile_output):
     """Simple command-line tool to interact with dingz devices."""
 
 
 @main.command("discover")
 @coro
-async def discover():
+@click.option("--timeout", default=7, help="Seconds to wait for announcements.")
+@click.option("--address", default="0.0.0.0", help="Address to listen on.")
+@click.option("--port", default=DISCOVERY_PORT, help="Port to listen on.")
+async def discover(timeout, address, port):
     """Read the current configuration of a myStrom device."""
     click.echo("Waiting for UDP broadcast packages...")
-    devices = await discover_dingz_devices()
+    devices = await discover_dingz_devices(timeout=timeout, host=address, port=port)
+
+    print(f"Found {len(devices)} devices")
+    for device in devices:
+        print(
+            f"  MAC address: {device.mac}, IP address: {device.host}, HW: {device.hardware}"
+        )
+
+
+@main.command("probe")
+@coro
+@click.argument("network")
+@click.option("--timeout", default=2.0, help="Seconds to wait for a single host.")
+async def probe(network, timeout):
+    """Probe all hosts of a network (CIDR notation) for dingz devices."""
+    click.echo("Probing %s..." % network)
+    devices = await probe_dingz_devices(network, timeout=timeout)
 
     print(f"Found {len(devices)} devices")
     for device in devices:
@@ -96,5 +137,45 @@ async def get_status(ip):
         click.echo(await dingz.enabled())
 
 
+@main.group("config")
+def config():
+    """Back up and restore the configuration of dingz devices."""
+
+
+@config.command("snapshot")
+@coro
+@click.option("--store", required=True, help="Directory of the configuration store.")
+@click.option("--name", required=True, help="Name of the snapshot.")
+@click.argument("hosts", nargs=-1, required=True)
+async def config_snapshot(store, name, hosts):
+    """Store the configuration of the given devices."""
+    async with DingzFleet(hosts) as fleet:
+        manifest, failures = await snapshot_fleet(fleet, ConfigStore(store), name=name)
+
+    click.echo(f"Stored the configuration of {len(manifest)} devices")
+    for host, exception in failures.items():
+        click.echo(f"  Failed: {host} ({exception})")
+
+
+@config.command("restore")
+@coro
+@click.option("--store", required=True, help="Directory of the configuration store.")
+@click.option("--name", required=True, help="Name of the snapshot.")
+@click.option("--dry-run", is_flag=True, help="Only show what would be written.")
+@click.argument("hosts", nargs=-1)
+async def config_restore(store, name, dry_run, hosts):
+    """Restore the configuration of the devices in a snapshot."""
+    store = ConfigStore(store)
+    manifest = store.load_manifest(name)
+    async with DingzFleet(hosts or manifest) as fleet:
+        results = await restore_fleet(fleet, store, manifest, dry_run=dry_run)
+
+    for host, result in results.items():
+        if isinstance(result, BaseException):
+            click.echo(f"  {host}: failed ({result})")
+        else:
+            click.echo(f"  {host}: {', '.join(result) or 'unchanged'}")
+
+
 if __name__ == "__main__":
     main()
@@ -7,6 +7,8 @@ except Exception:
     __version__ = "unknown"
 
 TIMEOUT = 10
+UPLOAD_TIMEOUT = 300
+CHUNK_SIZE = 65536
 
 USER_AGENT = f"PythonDingz/{__version__}"
 API = "/api/v1/"
@@ -24,6 +26,12 @@ TIMER = "timer"
 SHADE = "shade"
 STATE = "state"
 
+# Sensor poll strategies
+SENSOR_POLL_STATE = "state"
+SENSOR_POLL_ENDPOINTS = "endpoints"
+# Approximate size of the headers of a response, added per request
+RESPONSE_HEADER_SIZE = 150
+
 # Special endpoints
 LOG = "/log"
 FIRMWARE = "/load"
@@ -43,9 +51,12 @@ THERMOSTAT_CONFIGURATION = "thermostat_config"
 INPUT_CONFIGURATION = "input_config"
 
 # Communication constants
+DISCOVERY_PORT = 7979
 CONTENT_TYPE_JSON = "application/json"
 CONTENT_TYPE = "Content-Type"
 CONTENT_TYPE_TEXT_PLAIN = "text/plain"
+CONTENT_TYPE_OCTET_STREAM = "application/octet-stream"
+CONTENT_LENGTH = "Content-Length"
 
 DEVICE_MAPPING = {
     "102": "myStrom Bulb",
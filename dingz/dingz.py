@@ -1,26 +1,41 @@
 """Python client/wrapper to interact with dingz devices."""
+import asyncio
 import logging
+import os
+import uuid
+from typing import Any, AsyncIterator, Callable, Optional
 
 import aiohttp
 from yarl import URL
 
-from . import make_call
+from . import _measured_call, make_call, stream_call
 from .constants import (
     API,
     BUTTON_ACTIONS,
+    CHUNK_SIZE,
+    CONTENT_LENGTH,
+    CONTENT_TYPE,
+    CONTENT_TYPE_OCTET_STREAM,
     DEVICE_INFO,
+    FIRMWARE,
     FRONT_LED_GET,
     FRONT_LED_SET,
     INPUT_CONFIGURATION,
     LIGHT,
+    LOG,
+    MOTION,
     PIR_CONFIGURATION,
     PUCK,
+    RESPONSE_HEADER_SIZE,
     SETTINGS,
     TEMPERATURE,
     THERMOSTAT_CONFIGURATION,
+    UPLOAD_TIMEOUT,
     WIFI_SCAN,
     TIMER,
     SCHEDULE,
+    SENSOR_POLL_ENDPOINTS,
+    SENSOR_POLL_STATE,
     INFO,
     STATE,
     SYSTEM_CONFIG,
@@ -28,7 +43,14 @@ from .constants import (
     DIMMER_CONFIGURATION, SHADE,
 )
 from .dimmer import DimmerRegistry
+from .exceptions import DingzResponseError
+from .profiling import PHASE_CONSUME, PHASE_URL, phase
+from .ratelimit import TokenBucket
+from .recorder import SensorRecorder
+from .scheduler import PRIORITY_CONFIG, RequestScheduler
 from .shade import ShadeRegistry
+from .snapshot import StateSnapshot
+from .transport import Transport
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -36,11 +58,32 @@ _LOGGER = logging.getLogger(__name__)
 class Dingz:
     """A class for handling the communication with a dingz device."""
 
-    def __init__(self, host: str, session: aiohttp.client.ClientSession = None) -> None:
-        """Initialize the dingz."""
+    def __init__(
+        self,
+        host: str,
+        session: aiohttp.client.ClientSession = None,
+        recorder: SensorRecorder = None,
+        scheduler: RequestScheduler = None,
+        rate_limiter: TokenBucket = None,
+        transport: Transport = None,
+    ) -> None:
+        """Initialize the dingz.
+
+        :param rate_limiter: limits the requests sent, see ``shared_token_bucket``
+                             to share a limit between clients of the same unit
+        :param transport: sends the requests, an ``AiohttpTransport`` using the
+                          session by default. A given transport is owned by the
+                          caller, who has to close it (e.g. to finish a recording).
+        """
         self._close_session = False
         self._host = host
         self._session = session
+        self._recorder = recorder
+        self._scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self._pending_calls = {}
+        self._rate_limiter = rate_limiter
+        self._transport = transport
+        self._close_transport = False
         self._device_details = None
         self._info = None
         self._wifi_networks = None
@@ -53,9 +96,11 @@ class Dingz:
         self._night = None
         self._hour_of_day = None
         self._motion = None
+        self._sensor_poll_strategy = None
         self._schedule = None
         self._timer = None
         self._state = {}
+        self._snapshot = None
         self._blind_config = None
         self._dimmer_config = None
         self._system_config = None
@@ -69,14 +114,14 @@ class Dingz:
     async def get_device_info(self) -> None:
         """Get the details from the dingz."""
         url = URL(self.uri).join(URL(DEVICE_INFO))
-        response = await make_call(self, uri=url)
+        response = await make_call(self, uri=url, priority=PRIORITY_CONFIG)
         # response is:  "mac" => { device_details }
         self._device_details = next(iter(response.values()))
 
     async def get_info(self) -> None:
         """Get general information fro the dingz."""
         url = URL(self.uri).join(URL(INFO))
-        response = await make_call(self, uri=url)
+        response = await make_call(self, uri=url, priority=PRIORITY_CONFIG)
         self._info = response
 
     async def get_all_info(self) -> None:
@@ -91,27 +136,27 @@ class Dingz:
             BUTTON_ACTIONS,
         ]:
             url = URL(self.uri).join(URL(endpoint))
-            self._catch_all[endpoint] = await make_call(self, uri=url)
+            self._catch_all[endpoint] = await make_call(self, uri=url, priority=PRIORITY_CONFIG)
 
     async def get_settings(self) -> None:
         """Get the settings from the dingz."""
         url = URL(self.uri).join(URL(SETTINGS))
-        self._settings = await make_call(self, uri=url)
+        self._settings = await make_call(self, uri=url, priority=PRIORITY_CONFIG)
 
     async def get_wifi_networks(self) -> None:
         """Get the Wifi networks in range."""
         url = URL(self.uri).join(URL(WIFI_SCAN))
-        self._wifi_networks = await make_call(self, uri=url)
+        self._wifi_networks = await make_call(self, uri=url, priority=PRIORITY_CONFIG)
 
     async def get_schedule(self) -> None:
         """Get the available schedules."""
         url = URL(self.uri).join(URL(SCHEDULE))
-        self._schedule = await make_call(self, uri=url)
+        self._schedule = await make_call(self, uri=url, priority=PRIORITY_CONFIG)
 
     async def get_timer(self) -> None:
         """Get the available timers."""
         url = URL(self.uri).join(URL(TIMER))
-        self._timer = await make_call(self, uri=url)
+        self._timer = await make_call(self, uri=url, priority=PRIORITY_CONFIG)
 
     async def get_configuration(self, part) -> None:
         """Get the configuration of a dingz part."""
@@ -122,7 +167,7 @@ class Dingz:
         }
         url_part = [value for key, value in urls.items() if part in key][0]
         url = URL(self.uri).join(URL(url_part))
-        self._configuration = await make_call(self, uri=url)
+        self._configuration = await make_call(self, uri=url, priority=PRIORITY_CONFIG)
 
     async def get_temperature(self) -> None:
         """Get the room temperature from the dingz."""
@@ -133,7 +178,7 @@ class Dingz:
     async def get_button_action(self) -> None:
         """Get the room temperature from the dingz."""
         url = URL(self.uri).join(URL(BUTTON_ACTIONS))
-        self._button_action = await make_call(self, uri=url)
+        self._button_action = await make_call(self, uri=url, priority=PRIORITY_CONFIG)
 
     async def get_light(self) -> None:
         """Get the light details from the switch."""
@@ -142,56 +187,156 @@ class Dingz:
         self._intensity = response["intensity"]
         self._hour_of_day = response["state"]
 
+    async def get_motion(self) -> None:
+        """Get the motion state from the dingz."""
+        url = URL(self.uri).join(URL(MOTION))
+        response = await make_call(self, uri=url)
+        self._motion = bool(response["motion"])
+
     def _consume_sensor_state(self, response):
         self._intensity = response["brightness"]
         self._hour_of_day = response["light_state"]
         self._temperature = response["room_temperature"]
         self._motion = response["person_present"] == 1
+        self._record_sensors()
+
+    def _record_sensors(self):
+        if self._recorder is not None:
+            self._recorder.record(
+                self._temperature, self._intensity, self._hour_of_day, self._motion
+            )
+
+    async def get_sensors(self, strategy: Optional[str] = None) -> None:
+        """
+        Fetch only the sensor readings (temperature, light and motion).
+
+        Dimmers and shades are not updated and no shade request is made.
+
+        :param strategy: ``SENSOR_POLL_STATE`` to read them from the state,
+                         ``SENSOR_POLL_ENDPOINTS`` to use the temp, light and motion
+                         endpoints. By default the cheaper one is measured on first use.
+        """
+        if strategy is None:
+            if self._sensor_poll_strategy is None:
+                # The measurement already updated the sensors, no need to poll again
+                self._sensor_poll_strategy = await self._measure_sensor_poll_strategy()
+                return
+            strategy = self._sensor_poll_strategy
+
+        if strategy == SENSOR_POLL_STATE:
+            url = URL(self.uri).join(URL(STATE))
+            device_state = await make_call(self, uri=url)
+            self._consume_sensor_state(device_state["sensors"])
+        elif strategy == SENSOR_POLL_ENDPOINTS:
+            await asyncio.gather(self.get_temperature(), self.get_light(), self.get_motion())
+            self._record_sensors()
+        else:
+            raise ValueError(
+                "invalid strategy %s, expected one of %s"
+                % (repr(strategy), repr((SENSOR_POLL_STATE, SENSOR_POLL_ENDPOINTS)))
+            )
+
+    async def _measure_sensor_poll_strategy(self) -> str:
+        """
+        Update the sensors both ways and return the strategy with the smaller payload.
+
+        The payload is the size of the response bodies received, plus
+        ``RESPONSE_HEADER_SIZE`` per response for the headers, which the
+        transports do not report.
+        """
+        endpoints = (STATE, TEMPERATURE, LIGHT, MOTION)
+        measured = await asyncio.gather(
+            *(_measured_call(self, URL(self.uri).join(URL(endpoint))) for endpoint in endpoints)
+        )
+        responses = [response for response, _ in measured]
+        sizes = [size + RESPONSE_HEADER_SIZE for _, size in measured]
+        state_size, endpoints_size = sizes[0], sum(sizes[1:])
+        _LOGGER.debug(
+            "Sensor payload: state %s bytes, endpoints %s bytes", state_size, endpoints_size
+        )
+
+        state, temperature, light, motion = responses
+        if endpoints_size < state_size:
+            self._temperature = temperature["temperature"]
+            self._intensity = light["intensity"]
+            self._hour_of_day = light["state"]
+            self._motion = bool(motion["motion"])
+            self._record_sensors()
+            return SENSOR_POLL_ENDPOINTS
+        self._consume_sensor_state(state["sensors"])
+        return SENSOR_POLL_STATE
 
     async def get_state(self) -> None:
         """Fetch the current state and update the different internal representations."""
+        with phase(PHASE_URL):
+            state_url = URL(self.uri).join(URL(STATE))
+            shade_url = URL(self.uri).join(URL(SHADE))
 
-        # first fetch the device state
-        url = URL(self.uri).join(URL(STATE))
-        device_state = await make_call(self, uri=url)
-        self._consume_sensor_state(device_state['sensors'])
-        self._dimmers._consume_dimmer_state(device_state['dimmers'])
-        self._shades._consume_device_state(device_state['blinds'])
+        shade_state = None
+        if len(self._shades.all()) > 0:
+            # shades are known from an earlier poll, fetch their positions at the same time
+            device_state, shade_state = await asyncio.gather(
+                make_call(self, uri=state_url), make_call(self, uri=shade_url)
+            )
+        else:
+            device_state = await make_call(self, uri=state_url)
+
+        try:
+            with phase(PHASE_CONSUME):
+                self._consume_sensor_state(device_state['sensors'])
+                self._dimmers._consume_dimmer_state(device_state['dimmers'])
+                self._shades._consume_device_state(device_state['blinds'])
+        except (KeyError, TypeError, AttributeError) as exception:
+            raise DingzResponseError("Unexpected state from dingz %s" % self.host) from exception
         self._state = device_state
 
-        if len(self._shades.all()) > 0:
+        if shade_state is None and len(self._shades.all()) > 0:
             # for shades, we want to call shade api as well, as it contains the current positions
-            url = URL(self.uri).join(URL(SHADE))
-            shade_state = await make_call(self, uri=url)
-            self._shades._consume_shade_state(shade_state.values())
+            shade_state = await make_call(self, uri=shade_url)
+
+        try:
+            with phase(PHASE_CONSUME):
+                shade_states = None
+                if shade_state is not None:
+                    shade_states = shade_state.values()
+                    self._shades._consume_shade_state(shade_states)
+
+                self._snapshot = StateSnapshot.from_json(device_state, shade_states)
+        except (KeyError, TypeError, AttributeError) as exception:
+            raise DingzResponseError("Unexpected shade state from dingz %s" % self.host) from exception
 
     async def get_blind_config(self) -> None:
         """Get the configuration of the blinds."""
         url = URL(self.uri).join(URL(BLIND_CONFIGURATION))
-        response = await make_call(self, uri=url)
+        response = await make_call(self, uri=url, priority=PRIORITY_CONFIG)
         self._blind_config = response['blinds']
 
     async def get_dimmer_config(self) -> None:
         """Get the configuration of the dimmer/lights."""
         url = URL(self.uri).join(URL(DIMMER_CONFIGURATION))
-        response = await make_call(self, uri=url)
+        response = await make_call(self, uri=url, priority=PRIORITY_CONFIG)
         self._dimmer_config = response['dimmers']
 
     async def get_system_config(self) -> None:
         """Get the system configuration of a dingz."""
         url = URL(self.uri).join(URL(SYSTEM_CONFIG))
-        response = await make_call(self, uri=url)
+        response = await make_call(self, uri=url, priority=PRIORITY_CONFIG)
         self._system_config = response
 
-    async def get_devices_config(self) -> None:
+    async def get_devices_config(self, refresh: bool = False) -> None:
         """
         Try to determine the full devices configuration of the device.
 
         Load the blind/dimmer config. Determine what is attached, and resolve the names.
+        The state and the configuration are fetched concurrently. The configuration is
+        kept and only fetched again if ``refresh`` is set or after ``invalidate_config``.
         """
-        await self.get_state()
-        await self.get_blind_config()
-        await self.get_dimmer_config()
+        fetches = [self.get_state()]
+        if refresh or self._blind_config is None:
+            fetches.append(self.get_blind_config())
+        if refresh or self._dimmer_config is None:
+            fetches.append(self.get_dimmer_config())
+        await asyncio.gather(*fetches)
 
         # all blinds/dimmers are visible in the device config, regardless of their dip state.
         # => later in the getter, we correlate the config against the current state and
@@ -200,6 +345,11 @@ class Dingz:
         self._shades._consume_config(self._blind_config)
         self._dimmers._consume_config(self._dimmer_config)
 
+    def invalidate_config(self) -> None:
+        """Mark the blind/dimmer configuration as stale, it is fetched again on next use."""
+        self._blind_config = None
+        self._dimmer_config = None
+
     async def enabled(self) -> bool:
         """Return true if front LED is on."""
         url = URL(self.uri).join(URL(FRONT_LED_GET))
@@ -218,9 +368,13 @@ class Dingz:
         url = URL(self.uri).join(URL(FRONT_LED_SET))
         await make_call(self, uri=url, method="POST", data=data)
 
+    async def set_schedule(self, data) -> None:
+        """Replace the schedule."""
+        url = URL(self.uri).join(URL(SCHEDULE))
+        await make_call(self, uri=url, method="POST", json_data=data)
+
     async def set_timer(self, data) -> None:
         """Set a timer."""
-        print(data)
         url = URL(self.uri).join(URL(TIMER))
         await make_call(self, uri=url, method="POST", json_data=data)
 
@@ -229,6 +383,68 @@ class Dingz:
         url = URL(self.uri).join(URL(TIMER))
         await make_call(self, uri=url, method="POST", data=data)
 
+    async def stream_log(self, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Stream the log of the dingz in chunks."""
+        url = URL(self.uri).join(URL(LOG))
+        async for chunk in stream_call(self, uri=url, chunk_size=chunk_size):
+            yield chunk
+
+    async def upload_firmware(
+        self,
+        path: str,
+        progress: Optional[Callable[[int, int], None]] = None,
+        chunk_size: int = CHUNK_SIZE,
+    ) -> None:
+        """
+        Upload a firmware image to the dingz.
+
+        The image is read from disk chunk by chunk while it is sent.
+
+        :param path: path to the firmware image
+        :param progress: called with the bytes sent so far and the image size
+        :param chunk_size: size of the chunks read from disk
+        """
+        size = os.path.getsize(path)
+        boundary = uuid.uuid4().hex
+        head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{os.path.basename(path)}"\r\n'
+            f"{CONTENT_TYPE}: {CONTENT_TYPE_OCTET_STREAM}\r\n\r\n"
+        ).encode()
+        tail = f"\r\n--{boundary}--\r\n".encode()
+
+        async def read_image():
+            """Yield the multipart body, reading the image on demand."""
+            loop = asyncio.get_running_loop()
+            sent = 0
+            yield head
+            with open(path, "rb") as image:
+                while True:
+                    chunk = await loop.run_in_executor(None, image.read, chunk_size)
+                    if not chunk:
+                        break
+                    sent += len(chunk)
+                    yield chunk
+                    if progress is not None:
+                        progress(sent, size)
+            yield tail
+
+        # The length is given explicitly, the embedded server does not handle chunked uploads
+        headers = {
+            CONTENT_TYPE: f"multipart/form-data; boundary={boundary}",
+            CONTENT_LENGTH: str(len(head) + size + len(tail)),
+        }
+        url = URL(self.uri).join(URL(FIRMWARE))
+        async for _ in stream_call(
+            self, uri=url, method="POST", data=read_image(), headers=headers, timeout=UPLOAD_TIMEOUT
+        ):
+            pass
+
+    @property
+    def host(self) -> str:
+        """Return the host of the dingz."""
+        return self._host
+
     @property
     def shades(self) -> ShadeRegistry:
         """
@@ -241,38 +457,58 @@ class Dingz:
     def dimmers(self) -> DimmerRegistry:
         return self._dimmers
 
+    @property
+    def recorder(self) -> SensorRecorder:
+        """Return the recorder of the sensor readings, if any."""
+        return self._recorder
+
+    @property
+    def scheduler(self) -> RequestScheduler:
+        """Return the scheduler of the requests to the dingz."""
+        return self._scheduler
+
+    @property
+    def snapshot(self) -> Optional[StateSnapshot]:
+        """Return an immutable snapshot of the state fetched last."""
+        return self._snapshot
+
+    @property
+    def rate_limiter(self) -> Optional[TokenBucket]:
+        """Return the rate limiter of the requests to the dingz, if any."""
+        return self._rate_limiter
+
     @property
     def dingz_name(self) -> str:
         """Get the name of a dingz."""
         return self._system_config["dingz_name"]
 
     @property
-    def device_details(self) -> str:
+    def device_details(self) -> dict:
         """Return the current device details."""
         return self._device_details
 
     @property
-    def settings(self) -> str:
+    def settings(self) -> dict:
         """Return the current device settings."""
         return self._settings
 
     @property
-    def schedule(self) -> str:
+    def schedule(self) -> Any:
         """Return the schedule details."""
         return self._schedule
 
     @property
-    def timer(self) -> str:
+    def timer(self) -> Any:
         """Return the timer details."""
         return self._timer
 
     @property
-    def configuration(self) -> str:
+    def configuration(self) -> dict:
         """Return the current configuration of a dingz part."""
         return self._configuration
 
     @property
-    def wifi_networks(self) -> str:
+    def wifi_networks(self) -> Any:
         """Return the WiFi networks in range."""
         return self._wifi_networks
 
@@ -282,7 +518,7 @@ class Dingz:
         return self._catch_all
 
     @property
-    def button_action(self) -> float:
+    def button_action(self) -> dict:
         """Return the current button action."""
         return self._button_action
 
@@ -311,6 +547,11 @@ class Dingz:
         """Return the current light intensity in lux."""
         return round(self._intensity, 1)
 
+    @property
+    def info(self) -> dict:
+        """Return the general information of a dingz."""
+        return self._info
+
     @property
     def version(self) -> str:
         """Return the version of a dingz."""
@@ -359,7 +600,9 @@ class Dingz:
     # See "Using Asyncio in Python" by Caleb Hattingh for implementation
     # details.
     async def close(self) -> None:
-        """Close an open client session."""
+        """Close an open client session and the transport created by the client."""
+        if self._transport is not None and self._close_transport:
+            await self._transport.close()
         if self._session and self._close_session:
             await self._session.close()
 
@@ -1,13 +1,25 @@
 """Discover dingz devices in a network."""
 import asyncio
+import ipaddress
 import logging
-from typing import Optional, List
+import socket
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
-from .constants import DEVICE_MAPPING
+import aiohttp
+
+from .constants import DEVICE_MAPPING, DISCOVERY_PORT
+from .dingz import Dingz
+from .exceptions import DingzError
 
 _LOGGER = logging.getLogger(__name__)
 
 
+def normalize_mac(mac: str) -> str:
+    """Return a MAC address in the format of the announcements, e.g. ``aa:bb:cc:dd:ee:ff``."""
+    mac = mac.replace(":", "").replace("-", "").lower()
+    return ":".join(mac[i : i + 2] for i in range(0, 12, 2))
+
+
 class DiscoveredDevice(object):
     """Representation of discovered device."""
 
@@ -40,6 +52,23 @@ class DiscoveredDevice(object):
         device.restarted = status & 8 != 0
         return device
 
+    @staticmethod
+    def create_from_info(host, info):
+        """Create a device from the response of the info endpoint."""
+        _LOGGER.debug("Received info '%s' from %s ", info, host)
+        if not isinstance(info, dict) or "mac" not in info or "type" not in info:
+            raise RuntimeError("Unexpected info, '%s'" % info)
+
+        device = DiscoveredDevice(host=host, mac=normalize_mac(info["mac"]))
+        device.type = info["type"]
+        device.hardware = DEVICE_MAPPING.get(str(info["type"]), "unknown")
+        # The status flags are only part of the announcements
+        device.is_child = None
+        device.mystrom_registered = None
+        device.mystrom_online = None
+        device.restarted = None
+        return device
+
     def __init__(self, host, mac):
         """Initialize the discovery."""
         self.host = host
@@ -57,6 +86,23 @@ class DeviceRegistry(object):
         """Register a device."""
         self.devices_by_mac[device.mac] = device
 
+    def merge(self, device):
+        """
+        Merge a device into the registered one with the same MAC address.
+
+        Only the attributes known for ``device`` are taken over, so a probed
+        device keeps the status flags of an earlier announcement.
+        """
+        known = self.devices_by_mac.get(device.mac)
+        if known is None:
+            self.register(device)
+            return device
+
+        for name, value in vars(device).items():
+            if value is not None:
+                setattr(known, name, value)
+        return known
+
     def devices(self):
         """Get all present devices"""
         return list(self.devices_by_mac.values())
@@ -77,7 +123,11 @@ class DiscoveryProtocol(asyncio.DatagramProtocol):
 
     def datagram_received(self, data, addr):
         """Handle a datagram."""
-        device = DiscoveredDevice.create_from_announce_msg(addr, data)
+        try:
+            device = DiscoveredDevice.create_from_announce_msg(addr, data)
+        except RuntimeError as exception:
+            _LOGGER.debug("Ignoring datagram from %s: %s", addr, exception)
+            return
         self.registry.register(device)
 
     def connection_lost(self, exc: Optional[Exception]) -> None:
@@ -86,24 +136,114 @@ class DiscoveryProtocol(asyncio.DatagramProtocol):
         super().connection_lost(exc)
 
 
-async def discover_dingz_devices(timeout: int = 7) -> List[DiscoveredDevice]:
+class DiscoveryListener(object):
+    """
+    UDP listener for the announcements, shared within a process.
+
+    All consumers listening on the same address subscribe to the same
+    listener, so only one socket receives and parses the broadcasts. The
+    socket is opened with the first subscriber and closed with the last.
+    """
+
+    _listeners: Dict[Tuple[asyncio.AbstractEventLoop, str, int], "DiscoveryListener"] = {}
+
+    def __init__(self, host: str, port: int, reuse_port: bool) -> None:
+        """Initialize the listener."""
+        self.host = host
+        self.port = port
+        self.reuse_port = reuse_port and hasattr(socket, "SO_REUSEPORT")
+        self._subscribers = []
+        self._transport = None
+        self._started = None
+
+    @classmethod
+    async def subscribe(
+        cls,
+        registry: DeviceRegistry,
+        host: str = "0.0.0.0",
+        port: int = DISCOVERY_PORT,
+        reuse_port: bool = True,
+    ) -> "DiscoveryListener":
+        """
+        Register every announced device in ``registry`` until unsubscribed.
+
+        :param registry: any object with a ``register(device)`` method
+        :param host: address to bind to
+        :param port: port to bind to
+        :param reuse_port: allow other processes to bind the same port (SO_REUSEPORT)
+        :return: the listener, to unsubscribe from later
+        """
+        key = (asyncio.get_running_loop(), host, port)
+        listener = cls._listeners.get(key)
+        if listener is None:
+            listener = cls._listeners[key] = cls(host, port, reuse_port)
+            listener._started = asyncio.ensure_future(listener._start())
+
+        listener._subscribers.append(registry)
+        try:
+            await asyncio.shield(listener._started)
+        except BaseException:
+            # Also when cancelled, the socket must not stay bound without subscribers
+            listener.unsubscribe(registry)
+            raise
+        return listener
+
+    async def _start(self) -> None:
+        """Open the socket."""
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: DiscoveryProtocol(self),
+            local_addr=(self.host, self.port),
+            reuse_port=self.reuse_port,
+        )
+        if not self._subscribers:
+            # All subscribers left while the socket was being opened
+            self._transport.close()
+            self._transport = None
+
+    def register(self, device: DiscoveredDevice) -> None:
+        """Pass an announced device to all subscribers."""
+        for subscriber in list(self._subscribers):
+            subscriber.register(device)
+
+    def unsubscribe(self, registry: DeviceRegistry) -> None:
+        """Stop passing devices to ``registry``, close the socket if it was the last."""
+        if registry in self._subscribers:
+            self._subscribers.remove(registry)
+        if self._subscribers:
+            return
+
+        for key, listener in list(self._listeners.items()):
+            if listener is self:
+                del self._listeners[key]
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+
+async def discover_dingz_devices(
+    timeout: int = 7,
+    host: str = "0.0.0.0",
+    port: int = DISCOVERY_PORT,
+    reuse_port: bool = True,
+) -> List[DiscoveredDevice]:
     """
     Try to discover all local dingz instances. All dingz instances
     report their presence every ~5 seconds in an UDP broadcast to port 7979.
 
     :param timeout: timeout in seconds for discover.
+    :param host: address to listen on.
+    :param port: port to listen on.
+    :param reuse_port: allow other processes to listen on the same port.
     :return: list of discovered devices
     """
     registry = DeviceRegistry()
-    loop = asyncio.get_event_loop()
-    (transport, protocol) = await loop.create_datagram_endpoint(
-        lambda: DiscoveryProtocol(registry), local_addr=("0.0.0.0", 7979)
-    )
-    # Server runs in the background, meanwhile wait until timeout expires
-    await asyncio.sleep(timeout)
-
-    # Shutdown server
-    transport.close()
+    listener = await DiscoveryListener.subscribe(registry, host, port, reuse_port)
+    # Listener runs in the background, meanwhile wait until timeout expires
+    try:
+        await asyncio.sleep(timeout)
+    finally:
+        listener.unsubscribe(registry)
 
     devices = registry.devices()
     for device in devices:
@@ -111,3 +251,50 @@ async def discover_dingz_devices(timeout: int = 7) -> List[DiscoveredDevice]:
             "Discovered dingz %s (%s) (MAC address: %s)", device.host, device.type, device.mac
         )
     return devices
+
+
+async def probe_dingz_devices(
+    hosts: Union[str, Iterable[str]],
+    registry: Optional[DeviceRegistry] = None,
+    concurrency: int = 64,
+    timeout: float = 2,
+) -> List[DiscoveredDevice]:
+    """
+    Actively probe hosts for dingz units using their info endpoint.
+
+    Unlike the broadcast discovery this works across routed networks and does
+    not have to wait for the announcements.
+
+    :param hosts: network in CIDR notation (e.g. "192.168.1.0/24") or list of hosts
+    :param registry: registry the found devices are merged into, e.g. the one of
+                     a passive discovery
+    :param concurrency: number of hosts probed at the same time
+    :param timeout: timeout in seconds for a single host
+    :return: list of the devices found by the probe
+    """
+    if isinstance(hosts, str):
+        hosts = [str(address) for address in ipaddress.ip_network(hosts, strict=False).hosts()]
+    registry = registry if registry is not None else DeviceRegistry()
+    semaphore = asyncio.Semaphore(concurrency)
+    found = []
+
+    async def probe(session: aiohttp.ClientSession, host: str) -> None:
+        async with semaphore:
+            dingz = Dingz(host, session=session)
+            try:
+                await dingz.get_info()
+                device = DiscoveredDevice.create_from_info(host, dingz.info)
+            except (DingzError, aiohttp.ClientError, RuntimeError, ValueError):
+                return
+        found.append(registry.merge(device))
+
+    client_timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=timeout)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        await asyncio.gather(*(probe(session, host) for host in hosts))
+
+    for device in found:
+        _LOGGER.debug(
+            "Probed dingz %s (%s) (MAC address: %s)", device.host, device.type, device.mac
+        )
+    return found
@@ -17,3 +17,21 @@ class DingzNoDataAvailable(DingzError):
     """When no data is available."""
 
     pass
+
+
+class DingzFirmwareError(DingzError):
+    """When a firmware update fails."""
+
+    pass
+
+
+class DingzRateLimitError(DingzError):
+    """When a request exceeds the rate limit of a dingz."""
+
+    pass
+
+
+class DingzResponseError(DingzError):
+    """When a dingz responds with an error or an unexpected payload."""
+
+    pass
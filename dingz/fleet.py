@@ -0,0 +1,247 @@
+"""Handle many dingz units at once."""
+import asyncio
+from collections import OrderedDict, deque
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+)
+
+import aiohttp
+
+from .dingz import Dingz
+from .exceptions import DingzError, DingzResponseError
+from .snapshot import StateSnapshot
+from .transport import Transport
+
+# What happens to pending updates if the consumer is slower than the polling
+OVERFLOW_COALESCE = "coalesce"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+
+
+def _polling_error(dingz: Dingz, exception: Exception) -> DingzError:
+    """Return an unexpected exception raised while polling a unit as ``DingzError``."""
+    error = DingzResponseError("Polling %s failed: %r" % (dingz.host, exception))
+    error.__cause__ = exception
+    return error
+
+
+class StateUpdate(NamedTuple):
+    """State of a unit, or the error that occurred while polling it."""
+
+    host: str
+    snapshot: Optional[StateSnapshot]
+    error: Optional[DingzError]
+
+
+class UpdateBuffer(object):
+    """
+    Bounded buffer of state updates.
+
+    With ``OVERFLOW_COALESCE`` a pending update of a unit is replaced by a
+    newer one, with ``OVERFLOW_DROP_OLDEST`` the oldest pending update is
+    dropped once ``maxsize`` is reached.
+    """
+
+    def __init__(self, maxsize: int, overflow: str = OVERFLOW_COALESCE) -> None:
+        """Initialize the buffer."""
+        if overflow not in (OVERFLOW_COALESCE, OVERFLOW_DROP_OLDEST):
+            raise ValueError(
+                "invalid overflow %s, expected one of %s"
+                % (repr(overflow), repr((OVERFLOW_COALESCE, OVERFLOW_DROP_OLDEST)))
+            )
+
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.dropped = 0
+        self._coalesced = OrderedDict()
+        self._queue = deque()
+        self._available = asyncio.Event()
+
+    def __len__(self) -> int:
+        """Return the number of pending updates."""
+        return len(self._coalesced) + len(self._queue)
+
+    def put(self, update: StateUpdate) -> None:
+        """Add an update without ever blocking."""
+        if self.overflow == OVERFLOW_COALESCE and update.host in self._coalesced:
+            self._coalesced[update.host] = update
+            self.dropped += 1
+        else:
+            if len(self) >= self.maxsize:
+                self.pop()
+                self.dropped += 1
+            if self.overflow == OVERFLOW_COALESCE:
+                self._coalesced[update.host] = update
+            else:
+                self._queue.append(update)
+        self._available.set()
+
+    def pop(self) -> StateUpdate:
+        """Remove and return the oldest pending update."""
+        if self._coalesced:
+            return self._coalesced.popitem(last=False)[1]
+        return self._queue.popleft()
+
+    def wake_up(self) -> None:
+        """Wake up the consumer even without a new update."""
+        self._available.set()
+
+    async def wait(self) -> None:
+        """Wait until an update was added or ``wake_up`` was called."""
+        await self._available.wait()
+        self._available.clear()
+
+
+class DingzFleet(object):
+    """A group of dingz units sharing one client session."""
+
+    def __init__(
+        self,
+        hosts: Iterable[str],
+        session: aiohttp.client.ClientSession = None,
+        concurrency: int = 10,
+        transport: Transport = None,
+    ) -> None:
+        """Initialize the fleet.
+
+        :param hosts: IP addresses or host names of the units
+        :param session: session shared by all units, created if not given
+        :param concurrency: default number of units handled at the same time
+        :param transport: transport shared by all units, e.g. to record or replay,
+                          owned by the caller who has to close it
+        """
+        self._close_session = False
+        self._session = session
+        self._hosts = list(dict.fromkeys(hosts))
+        self._devices: Dict[str, Dingz] = {}
+        self.concurrency = concurrency
+        self._transport = transport
+
+    @property
+    def hosts(self) -> List[str]:
+        """Return the hosts of the fleet."""
+        return list(self._hosts)
+
+    def add(self, host: str) -> None:
+        """Add a unit to the fleet."""
+        if host not in self._hosts:
+            self._hosts.append(host)
+
+    def get(self, host: str) -> Dingz:
+        """Return the client of a unit."""
+        dingz = self._devices.get(host)
+        if dingz is None:
+            if self._session is None:
+                self._session = aiohttp.ClientSession()
+                self._close_session = True
+            dingz = self._devices[host] = Dingz(
+                host, session=self._session, transport=self._transport
+            )
+        return dingz
+
+    async def run(
+        self,
+        func: Callable[[Dingz], Awaitable[Any]],
+        hosts: Optional[Iterable[str]] = None,
+        concurrency: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run ``func`` for every unit, with a limited number running at once.
+
+        :param func: coroutine function called with the ``Dingz`` of a unit
+        :param hosts: only run for these hosts, all units if not given
+        :param concurrency: overrides the default concurrency of the fleet
+        :return: the result, or the raised exception, per host
+        """
+        hosts = self._hosts if hosts is None else list(hosts)
+        semaphore = asyncio.Semaphore(concurrency or self.concurrency)
+
+        async def run_limited(host):
+            async with semaphore:
+                return await func(self.get(host))
+
+        results = await asyncio.gather(
+            *(run_limited(host) for host in hosts), return_exceptions=True
+        )
+        return dict(zip(hosts, results))
+
+    async def stream_states(
+        self,
+        interval: Optional[float] = None,
+        maxsize: Optional[int] = None,
+        overflow: str = OVERFLOW_COALESCE,
+        concurrency: Optional[int] = None,
+    ) -> AsyncIterator[StateUpdate]:
+        """
+        Poll the state of all units and yield every update as soon as it arrives.
+
+        Polling does not wait for the consumer. If the consumer falls behind,
+        pending updates are coalesced per unit or the oldest are dropped, so
+        the memory used stays bounded.
+
+        >>> async for update in fleet.stream_states(interval=10):
+        ...     publish(update.host, update.snapshot)
+
+        :param interval: seconds between two polls of a unit, poll once if not given
+        :param maxsize: maximal pending updates, the number of units by default
+        :param overflow: ``OVERFLOW_COALESCE`` or ``OVERFLOW_DROP_OLDEST``
+        :param concurrency: overrides the default concurrency of the fleet
+        """
+        hosts = list(self._hosts)
+        buffer = UpdateBuffer(maxsize or max(len(hosts), 1), overflow)
+        semaphore = asyncio.Semaphore(concurrency or self.concurrency)
+
+        async def poll(dingz: Dingz) -> None:
+            while True:
+                async with semaphore:
+                    try:
+                        await dingz.get_state()
+                        update = StateUpdate(dingz.host, dingz.snapshot, None)
+                    except DingzError as exception:
+                        update = StateUpdate(dingz.host, None, exception)
+                    except Exception as exception:
+                        # A single misbehaving unit must not end the stream of all others
+                        update = StateUpdate(dingz.host, None, _polling_error(dingz, exception))
+                buffer.put(update)
+                if interval is None:
+                    return
+                await asyncio.sleep(interval)
+
+        pollers = [asyncio.ensure_future(poll(self.get(host))) for host in hosts]
+        for poller in pollers:
+            poller.add_done_callback(lambda _: buffer.wake_up())
+
+        try:
+            while True:
+                while len(buffer):
+                    yield buffer.pop()
+                for poller in pollers:
+                    if poller.done() and not poller.cancelled() and poller.exception():
+                        raise poller.exception()
+                if all(poller.done() for poller in pollers):
+                    return
+                await buffer.wait()
+        finally:
+            for poller in pollers:
+                poller.cancel()
+            await asyncio.gather(*pollers, return_exceptions=True)
+
+    async def close(self) -> None:
+        """Close an open client session."""
+        if self._session and self._close_session:
+            await self._session.close()
+
+    async def __aenter__(self) -> "DingzFleet":
+        """Async enter."""
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Async exit."""
+        await self.close()
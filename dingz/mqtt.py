@@ -0,0 +1,316 @@
+"""Bridge the state of many dingz units to MQTT."""
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+from .exceptions import DingzError
+from .fleet import DingzFleet, StateUpdate
+from .poller import diff_fields, flatten_snapshot
+from .registry import BaseRegistry
+
+_LOGGER = logging.getLogger(__name__)
+
+# A message is the topic and the payload
+Message = Tuple[str, Union[str, bytes]]
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """Return True if the topic matches the filter, which may contain ``+`` and ``#``."""
+    levels = topic.split("/")
+    for index, level in enumerate(topic_filter.split("/")):
+        if level == "#":
+            return True
+        if index >= len(levels) or (level != "+" and level != levels[index]):
+            return False
+    return len(levels) == len(topic_filter.split("/"))
+
+
+def _known(registry: BaseRegistry, absolute_index: int) -> Any:
+    """Return the dimmer or shade seen in the state, None if there is none with the index."""
+    # Not ``registry.get``, it would add an entry for every index sent by a publisher
+    return next((item for item in registry.all() if item.absolute_index == absolute_index), None)
+
+
+class MqttClient(ABC):
+    """
+    Base class of the MQTT clients used by the bridge.
+
+    Clients are async context managers connecting on enter and
+    disconnecting on exit.
+    """
+
+    async def connect(self) -> None:
+        """Connect to the broker."""
+
+    async def close(self) -> None:
+        """Disconnect from the broker."""
+
+    @abstractmethod
+    async def publish(self, topic: str, payload: Union[str, bytes], retain: bool = False) -> None:
+        """Publish a message."""
+
+    async def publish_many(self, messages: Iterable[Message], retain: bool = False) -> None:
+        """Publish several messages, the default publishes them concurrently."""
+        await asyncio.gather(*(self.publish(topic, payload, retain) for topic, payload in messages))
+
+    @abstractmethod
+    async def subscribe(self, topic_filter: str) -> None:
+        """Subscribe to a topic filter."""
+
+    @abstractmethod
+    def messages(self) -> AsyncIterator[Message]:
+        """Return the messages received for the subscriptions."""
+
+    async def __aenter__(self) -> "MqttClient":
+        """Async enter."""
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        """Async exit."""
+        await self.close()
+
+
+class InMemoryClient(MqttClient):
+    """
+    In-process stand-in for an MQTT broker and client.
+
+    Published messages are kept in ``published``, the last retained message
+    per topic in ``retained``. Messages for the subscriptions are injected
+    with ``inject``.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the client."""
+        self.published: List[Message] = []
+        self.retained: Dict[str, Union[str, bytes]] = {}
+        self.subscriptions: List[str] = []
+        self._incoming: Optional[asyncio.Queue] = None
+
+    def _queue(self) -> asyncio.Queue:
+        if self._incoming is None:
+            self._incoming = asyncio.Queue()
+        return self._incoming
+
+    async def publish(self, topic, payload, retain=False):
+        """Keep the published message."""
+        await self.publish_many([(topic, payload)], retain)
+
+    async def publish_many(self, messages, retain=False):
+        """Keep the published messages."""
+        messages = list(messages)
+        self.published.extend(messages)
+        if retain:
+            self.retained.update(messages)
+
+    async def subscribe(self, topic_filter):
+        """Add a subscription."""
+        self.subscriptions.append(topic_filter)
+
+    def inject(self, topic: str, payload: Union[str, bytes]) -> None:
+        """Deliver a message as if the broker sent it, if subscribed to."""
+        if any(topic_matches(topic_filter, topic) for topic_filter in self.subscriptions):
+            self._queue().put_nowait((topic, payload))
+
+    async def messages(self):
+        """Return the injected messages."""
+        while True:
+            yield await self._queue().get()
+
+
+class AiomqttClient(MqttClient):
+    """MQTT client using the optional ``aiomqtt`` package (``pip install dingz[mqtt]``)."""
+
+    def __init__(self, hostname: str, port: int = 1883, **kwargs) -> None:
+        """Initialize the client, ``kwargs`` are passed to ``aiomqtt.Client``."""
+        try:
+            import aiomqtt
+        except ImportError as exception:
+            raise ImportError(
+                "aiomqtt is required for AiomqttClient, install dingz[mqtt]"
+            ) from exception
+
+        self._client = aiomqtt.Client(hostname, port, **kwargs)
+
+    async def connect(self) -> None:
+        """Connect to the broker."""
+        await self._client.__aenter__()
+
+    async def close(self) -> None:
+        """Disconnect from the broker."""
+        await self._client.__aexit__(None, None, None)
+
+    async def publish(self, topic, payload, retain=False):
+        """Publish a message."""
+        await self._client.publish(topic, payload, retain=retain)
+
+    async def subscribe(self, topic_filter):
+        """Subscribe to a topic filter."""
+        await self._client.subscribe(topic_filter)
+
+    async def messages(self):
+        """Return the messages received for the subscriptions."""
+        async for message in self._client.messages:
+            yield message.topic.value, message.payload
+
+
+class MqttBridge(object):
+    """
+    Publish the state changes of a fleet to MQTT and forward commands to it.
+
+    Only the fields which changed since the last publish are sent. Changes
+    arriving within ``batch_interval`` are coalesced per unit and published
+    together, as one JSON object per unit on ``<prefix>/<host>/changes``.
+    With ``retain_state`` the complete state of every changed unit is also
+    published as retained message on ``<prefix>/<host>/state``, so new
+    subscribers start from a complete state.
+
+    Commands are accepted on:
+
+    - ``<prefix>/<host>/dimmers/<index>/set``: ``on``, ``off`` or
+      ``{"action": "on", "brightness_pct": 70}``
+    - ``<prefix>/<host>/shades/<index>/set``: ``{"blind": 100, "lamella": 0}``
+
+    >>> async with DingzFleet(hosts) as fleet, AiomqttClient("broker") as client:
+    ...     await MqttBridge(fleet, client).run()
+    """
+
+    def __init__(
+        self,
+        fleet: DingzFleet,
+        client: MqttClient,
+        prefix: str = "dingz",
+        interval: float = 10,
+        batch_interval: float = 0.5,
+        concurrency: Optional[int] = None,
+        retain_state: bool = True,
+    ) -> None:
+        """Initialize the bridge.
+
+        :param interval: seconds between two polls of a unit
+        :param batch_interval: seconds changes are collected before they are published
+        :param concurrency: overrides the default concurrency of the fleet
+        :param retain_state: publish the complete state of changed units, retained
+        """
+        self.fleet = fleet
+        self.client = client
+        self.prefix = prefix
+        self.interval = interval
+        self.batch_interval = batch_interval
+        self.concurrency = concurrency
+        self.retain_state = retain_state
+        self.messages_published = 0
+        self.fields_published = 0
+        self._previous: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._commands = set()
+
+    def consume(self, update: StateUpdate) -> None:
+        """Add the changes of a state update to the pending changes."""
+        previous = self._previous.get(update.host, {})
+        if update.error is None:
+            current = flatten_snapshot(update.snapshot)
+        else:
+            _LOGGER.debug("Polling %s failed: %s", update.host, update.error)
+            current = dict(previous, available=False)
+
+        changes = diff_fields(previous, current)
+        if changes:
+            self._pending.setdefault(update.host, {}).update(changes)
+        self._previous[update.host] = current
+
+    async def flush(self) -> None:
+        """Publish the pending changes, and the complete states if retained, per unit."""
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        messages = [
+            (f"{self.prefix}/{host}/changes", json.dumps(fields, separators=(",", ":")))
+            for host, fields in pending.items()
+        ]
+        await self.client.publish_many(messages)
+        self.messages_published += len(messages)
+        if self.retain_state:
+            states = [
+                (
+                    f"{self.prefix}/{host}/state",
+                    json.dumps(self._previous[host], separators=(",", ":")),
+                )
+                for host in pending
+            ]
+            await self.client.publish_many(states, retain=True)
+            self.messages_published += len(states)
+        self.fields_published += sum(len(fields) for fields in pending.values())
+
+    async def handle_command(self, topic: str, payload: Union[str, bytes]) -> None:
+        """Forward a command message to the dimmer or shade it addresses."""
+        levels = topic[len(self.prefix) + 1:].split("/")
+        if len(levels) != 4 or levels[3] != "set" or levels[0] not in self.fleet.hosts:
+            _LOGGER.warning("Ignoring message on unknown topic %s", topic)
+            return
+
+        host, kind, index, _ = levels
+        if isinstance(payload, bytes):
+            payload = payload.decode("utf-8", errors="replace")
+        try:
+            try:
+                command = json.loads(payload)
+            except ValueError:
+                command = payload.strip()
+
+            dingz = self.fleet.get(host)
+            if kind == "dimmers":
+                dimmer = _known(dingz.dimmers, int(index))
+                if dimmer is None:
+                    raise ValueError("unknown dimmer %s" % repr(index))
+                if not isinstance(command, dict):
+                    command = {"action": command}
+                await dimmer.operate_light(command.get("action"), command.get("brightness_pct"))
+            elif kind == "shades":
+                shade = _known(dingz.shades, int(index))
+                if shade is None or not isinstance(command, dict):
+                    raise ValueError("unknown shade %s or invalid command" % repr(index))
+                await shade.operate_shade(command.get("blind"), command.get("lamella"))
+            else:
+                raise ValueError("invalid kind %s, expected dimmers or shades" % repr(kind))
+        except (ValueError, TypeError, DingzError) as exception:
+            _LOGGER.warning("Command %s on %s failed: %s", payload, topic, exception)
+
+    async def _poll(self) -> None:
+        async for update in self.fleet.stream_states(
+            interval=self.interval, concurrency=self.concurrency
+        ):
+            self.consume(update)
+
+    async def _publish_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.batch_interval)
+            await self.flush()
+
+    async def _listen(self) -> None:
+        # Every command runs in its own task, a slow unit must not delay the others
+        async for topic, payload in self.client.messages():
+            command = asyncio.ensure_future(self.handle_command(topic, payload))
+            self._commands.add(command)
+            command.add_done_callback(self._commands.discard)
+
+    async def run(self) -> None:
+        """Poll the fleet, publish its changes and handle commands until cancelled."""
+        await self.client.subscribe(f"{self.prefix}/+/dimmers/+/set")
+        await self.client.subscribe(f"{self.prefix}/+/shades/+/set")
+
+        tasks = [
+            asyncio.ensure_future(self._poll()),
+            asyncio.ensure_future(self._publish_periodically()),
+            asyncio.ensure_future(self._listen()),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            tasks.extend(self._commands)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,263 @@
+"""Poll very large fleets of dingz units from several processes."""
+import asyncio
+import logging
+import multiprocessing
+import queue
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .dingz import Dingz
+from .exceptions import DingzError
+from .fleet import DingzFleet
+from .snapshot import StateSnapshot
+
+_LOGGER = logging.getLogger(__name__)
+
+# A delta is the host with the changed fields
+Delta = Tuple[str, Dict[str, Any]]
+
+
+def flatten_snapshot(snapshot: StateSnapshot) -> Dict[str, Any]:
+    """Return the fields of a snapshot as flat ``path -> value`` mapping."""
+    fields = {"available": True}
+    for name, value in zip(snapshot.sensors._fields, snapshot.sensors):
+        fields[f"sensors.{name}"] = value
+    for group, items in (("dimmers", snapshot.dimmers), ("shades", snapshot.shades)):
+        for item in items:
+            for name, value in zip(item._fields[1:], item[1:]):
+                fields[f"{group}.{item.absolute_index}.{name}"] = value
+    return fields
+
+
+def diff_fields(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the fields of ``current`` which are new or differ from ``previous``."""
+    return {key: value for key, value in current.items() if previous.get(key, ...) != value}
+
+
+class _DeltaEncoder(object):
+    """
+    Encode the deltas of a worker compactly for the transfer to the parent.
+
+    A delta is a tuple of the index of the host in the shard followed by the
+    index and the value of every changed field. Field paths get their index
+    when first seen and are sent once, with the batch that uses them first.
+    A batch is sent as ``(shard, new paths, deltas)``, which pickles to a half
+    to a fifth of the size of the deltas as host and field path dictionaries.
+    """
+
+    def __init__(self, shard: int, hosts: List[str]) -> None:
+        self.shard = shard
+        self._hosts = {host: index for index, host in enumerate(hosts)}
+        self._paths: Dict[str, int] = {}
+        self._new_paths: List[str] = []
+        self._deltas: List[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self._deltas)
+
+    def add(self, host: str, changes: Dict[str, Any]) -> None:
+        """Add the changed fields of a host to the batch."""
+        delta = [self._hosts[host]]
+        for path, value in changes.items():
+            index = self._paths.get(path)
+            if index is None:
+                index = self._paths[path] = len(self._paths)
+                self._new_paths.append(path)
+            delta += (index, value)
+        self._deltas.append(tuple(delta))
+
+    def pop_batch(self) -> Tuple[int, List[str], List[tuple]]:
+        """Return the encoded batch and start a new one."""
+        batch = (self.shard, self._new_paths, self._deltas)
+        self._new_paths, self._deltas = [], []
+        return batch
+
+
+class _DeltaDecoder(object):
+    """Decode the batches of all workers, see ``_DeltaEncoder``."""
+
+    def __init__(self, shards: List[List[str]]) -> None:
+        self._shards = shards
+        self._paths: List[List[str]] = [[] for _ in shards]
+
+    def decode(self, batch: Tuple[int, List[str], List[tuple]]) -> Iterator[Delta]:
+        """Yield the host and the changed fields of every delta in the batch."""
+        shard, new_paths, deltas = batch
+        paths = self._paths[shard]
+        paths.extend(new_paths)
+        hosts = self._shards[shard]
+        for delta in deltas:
+            yield hosts[delta[0]], {
+                paths[delta[index]]: delta[index + 1] for index in range(1, len(delta), 2)
+            }
+
+
+async def _poll_shard(
+    shard: int,
+    hosts: List[str],
+    interval: float,
+    concurrency: int,
+    batch_interval: float,
+    deltas,
+    stop,
+) -> None:
+    """Poll the hosts of a shard and send the deltas in batches."""
+    batch = _DeltaEncoder(shard, hosts)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def poll(dingz: Dingz) -> None:
+        previous: Dict[str, Any] = {}
+        while not stop.is_set():
+            async with semaphore:
+                try:
+                    await dingz.get_state()
+                    current = flatten_snapshot(dingz.snapshot)
+                except DingzError as exception:
+                    _LOGGER.debug("Polling %s failed: %s", dingz.host, exception)
+                    current = dict(previous, available=False)
+                except Exception:
+                    # Keep polling the unit, it may recover
+                    _LOGGER.exception("Polling %s failed unexpectedly", dingz.host)
+                    current = dict(previous, available=False)
+            changes = diff_fields(previous, current)
+            if changes:
+                batch.add(dingz.host, changes)
+            previous = current
+            await asyncio.sleep(interval)
+
+    async with DingzFleet(hosts) as fleet:
+        pollers = [asyncio.ensure_future(poll(fleet.get(host))) for host in hosts]
+        try:
+            while not stop.is_set():
+                await asyncio.sleep(batch_interval)
+                if batch:
+                    deltas.put(batch.pop_batch())
+        finally:
+            for poller in pollers:
+                poller.cancel()
+            await asyncio.gather(*pollers, return_exceptions=True)
+
+
+def _run_shard(
+    shard: int,
+    hosts: List[str],
+    interval: float,
+    concurrency: int,
+    batch_interval: float,
+    deltas,
+    stop,
+) -> None:
+    """Entry point of a worker process."""
+    # Pending batches are dropped on shutdown instead of blocking the exit
+    deltas.cancel_join_thread()
+    try:
+        asyncio.run(
+            _poll_shard(shard, hosts, interval, concurrency, batch_interval, deltas, stop)
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+class MultiProcessPoller(object):
+    """
+    Poll the state of many units, spread over a pool of worker processes.
+
+    Each worker polls its share of the hosts with its own event loop and
+    connection pool and only sends the changed fields back, batched and
+    compactly encoded, to the parent process.
+
+    >>> with MultiProcessPoller(hosts, processes=4) as poller:
+    ...     for host, changes in poller.deltas():
+    ...         print(host, changes)
+    """
+
+    def __init__(
+        self,
+        hosts: Iterable[str],
+        processes: Optional[int] = None,
+        interval: float = 10.0,
+        concurrency: int = 50,
+        batch_interval: float = 0.5,
+    ) -> None:
+        """Initialize the poller.
+
+        :param hosts: IP addresses or host names of the units
+        :param processes: number of worker processes, the CPU count by default
+        :param interval: seconds between two polls of a unit
+        :param concurrency: requests in flight per worker process
+        :param batch_interval: seconds a worker collects deltas before sending them
+        """
+        self.hosts = list(dict.fromkeys(hosts))
+        self.processes = processes or multiprocessing.cpu_count()
+        self.interval = interval
+        self.concurrency = concurrency
+        self.batch_interval = batch_interval
+        self.states: Dict[str, Dict[str, Any]] = {}
+        self._context = multiprocessing.get_context("spawn")
+        self._deltas = None
+        self._decoder = None
+        self._stop = None
+        self._workers: List[multiprocessing.Process] = []
+
+    def shards(self) -> List[List[str]]:
+        """Return the hosts assigned to every worker process."""
+        count = min(self.processes, len(self.hosts)) or 1
+        return [self.hosts[index::count] for index in range(count)]
+
+    def start(self) -> None:
+        """Start the worker processes."""
+        shards = self.shards()
+        self._deltas = self._context.Queue()
+        self._decoder = _DeltaDecoder(shards)
+        self._stop = self._context.Event()
+        for number, shard in enumerate(shards):
+            worker = self._context.Process(
+                target=_run_shard,
+                args=(
+                    number,
+                    shard,
+                    self.interval,
+                    self.concurrency,
+                    self.batch_interval,
+                    self._deltas,
+                    self._stop,
+                ),
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def deltas(self, timeout: Optional[float] = None) -> Iterator[Delta]:
+        """
+        Yield the changed fields per host as they arrive from the workers.
+
+        The merged state of every host is kept in ``states``.
+
+        :param timeout: stop iterating if no batch arrives within this time
+        """
+        while True:
+            try:
+                batch = self._deltas.get(timeout=timeout)
+            except queue.Empty:
+                return
+            for host, changes in self._decoder.decode(batch):
+                self.states.setdefault(host, {}).update(changes)
+                yield host, changes
+
+    def stop(self) -> None:
+        """Stop the worker processes."""
+        if self._stop is not None:
+            self._stop.set()
+        for worker in self._workers:
+            worker.join(self.interval + self.batch_interval + 5)
+            if worker.is_alive():
+                worker.terminate()
+        self._workers = []
+
+    def __enter__(self) -> "MultiProcessPoller":
+        """Enter."""
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Exit."""
+        self.stop()
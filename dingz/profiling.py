@@ -0,0 +1,185 @@
+"""Profile where the time of requests to dingz units goes."""
+import asyncio
+import cProfile
+import contextvars
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+# Phases measured by the client
+PHASE_CALL = "make_call"
+PHASE_RATE_LIMIT = "rate_limit"
+PHASE_REQUEST = "request"
+PHASE_DNS = "dns"
+PHASE_CONNECT = "connect"
+PHASE_DECODE = "decode"
+PHASE_URL = "url"
+PHASE_CONSUME = "consume"
+PHASE_LOOP_LAG = "loop_lag"
+
+_ACTIVE: contextvars.ContextVar = contextvars.ContextVar("dingz_profiler", default=None)
+
+
+class _Phase(object):
+    """Measure the time spent in a phase."""
+
+    __slots__ = ("_profiler", "_name", "_started")
+
+    def __init__(self, profiler: "Profiler", name: str) -> None:
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self) -> None:
+        self._started = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self._profiler.add(self._name, time.perf_counter() - self._started)
+
+
+class _NoPhase(object):
+    """Stand-in used while no profiler is active."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NO_PHASE = _NoPhase()
+
+
+def phase(name: str):
+    """Return a context manager timing ``name`` in the active profiler, if any."""
+    profiler = _ACTIVE.get()
+    if profiler is None:
+        return _NO_PHASE
+    return _Phase(profiler, name)
+
+
+def active_profiler() -> Optional["Profiler"]:
+    """Return the profiler active in the current context."""
+    return _ACTIVE.get()
+
+
+async def _on_dns_start(session, context, params) -> None:
+    context.dns_started = time.perf_counter()
+
+
+async def _on_dns_end(session, context, params) -> None:
+    profiler = _ACTIVE.get()
+    if profiler is not None and hasattr(context, "dns_started"):
+        profiler.add(PHASE_DNS, time.perf_counter() - context.dns_started)
+
+
+async def _on_connect_start(session, context, params) -> None:
+    context.connect_started = time.perf_counter()
+
+
+async def _on_connect_end(session, context, params) -> None:
+    profiler = _ACTIVE.get()
+    if profiler is not None and hasattr(context, "connect_started"):
+        profiler.add(PHASE_CONNECT, time.perf_counter() - context.connect_started)
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    """Return an aiohttp trace config reporting DNS and connect times to the profiler."""
+    config = aiohttp.TraceConfig()
+    config.on_dns_resolvehost_start.append(_on_dns_start)
+    config.on_dns_resolvehost_end.append(_on_dns_end)
+    config.on_connection_create_start.append(_on_connect_start)
+    config.on_connection_create_end.append(_on_connect_end)
+    return config
+
+
+class Profiler(object):
+    """
+    Collect the time spent per phase of the requests to dingz units.
+
+    >>> with Profiler() as profiler:
+    ...     await dingz.get_state()
+    >>> print(profiler.summary())
+
+    Sessions created by the client while the profiler is active report DNS
+    and connect times, pass ``trace_configs=[trace_config()]`` to own
+    sessions for the same. Within a running event loop the lag of the loop
+    is sampled as well. With ``cprofile`` a ``cProfile`` profile is recorded
+    that can be written with ``dump``.
+    """
+
+    def __init__(self, cprofile: bool = False, lag_interval: float = 0.05) -> None:
+        """Initialize the profiler."""
+        self.lag_interval = lag_interval
+        self.timings: Dict[str, List[float]] = {}
+        self._cprofile = cProfile.Profile() if cprofile else None
+        self._lag_monitor = None
+        self._token = None
+
+    def add(self, name: str, duration: float) -> None:
+        """Add the duration of a phase: count, total and maximum are kept."""
+        timing = self.timings.get(name)
+        if timing is None:
+            self.timings[name] = [1, duration, duration]
+        else:
+            timing[0] += 1
+            timing[1] += duration
+            if duration > timing[2]:
+                timing[2] = duration
+
+    async def _monitor_lag(self) -> None:
+        """Sample how late the event loop wakes up a sleeping task."""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            self.add(PHASE_LOOP_LAG, max(loop.time() - expected, 0))
+
+    def __enter__(self) -> "Profiler":
+        """Start profiling in the current context."""
+        self._token = _ACTIVE.set(self)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            self._lag_monitor = asyncio.ensure_future(self._monitor_lag())
+        if self._cprofile is not None:
+            self._cprofile.enable()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Stop profiling."""
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self._lag_monitor is not None:
+            self._lag_monitor.cancel()
+            self._lag_monitor = None
+        _ACTIVE.reset(self._token)
+
+    def summary(self) -> str:
+        """Return a table with the timings per phase."""
+        lines = [
+            "%-12s %8s %12s %10s %10s" % ("phase", "count", "total [ms]", "mean [ms]", "max [ms]")
+        ]
+        for name, (count, total, maximum) in sorted(
+            self.timings.items(), key=lambda item: item[1][1], reverse=True
+        ):
+            lines.append(
+                "%-12s %8d %12.2f %10.3f %10.3f"
+                % (name, count, total * 1000, total / count * 1000, maximum * 1000)
+            )
+        return "\n".join(lines)
+
+    def dump(self, path: str) -> None:
+        """Write the cProfile profile (readable with pstats, snakeviz, ...)."""
+        if self._cprofile is None:
+            raise RuntimeError("The profiler was not created with cprofile=True")
+        self._cprofile.dump_stats(path)
+
+
+def profile(cprofile: bool = False, lag_interval: float = 0.05) -> Profiler:
+    """Return a profiler to be used as context manager."""
+    return Profiler(cprofile=cprofile, lag_interval=lag_interval)
@@ -0,0 +1,133 @@
+"""Limit the request rate to dingz units."""
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .exceptions import DingzRateLimitError
+from .scheduler import PRIORITY_STATE
+
+# What happens to requests above the rate
+POLICY_QUEUE = "queue"
+POLICY_REJECT = "reject"
+
+_SHARED: Dict[str, "TokenBucket"] = {}
+
+
+class TokenBucket(object):
+    """
+    Token bucket limiting the requests sent to a dingz unit.
+
+    The bucket holds up to ``burst`` tokens and is refilled with ``rate``
+    tokens per second, every request takes one. Without a token the request
+    is either delayed until one is available (``POLICY_QUEUE``, at most
+    ``max_delay`` seconds) or rejected with ``DingzRateLimitError``
+    (``POLICY_REJECT``). Delayed requests receive the tokens by priority
+    class, so commands are not held up by throttled state polls.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        policy: str = POLICY_QUEUE,
+        max_delay: Optional[float] = None,
+    ) -> None:
+        """Initialize the token bucket."""
+        if rate <= 0 or burst < 1:
+            raise ValueError("invalid rate %s or burst %s" % (repr(rate), repr(burst)))
+        if policy not in (POLICY_QUEUE, POLICY_REJECT):
+            raise ValueError(
+                "invalid policy %s, expected one of %s"
+                % (repr(policy), repr((POLICY_QUEUE, POLICY_REJECT)))
+            )
+
+        self.rate = rate
+        self.burst = burst
+        self.policy = policy
+        self.max_delay = max_delay
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._wake_up: Optional[asyncio.TimerHandle] = None
+
+        self.acquired = 0
+        self.throttled = 0
+        self.rejected = 0
+
+    def _refill(self) -> None:
+        """Add the tokens accumulated since the last update."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, priority: int = PRIORITY_STATE) -> None:
+        """
+        Take a token, wait or raise ``DingzRateLimitError`` if none is left.
+
+        :param priority: one of the ``PRIORITY_*`` classes of the request
+        """
+        self._refill()
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        if self._tokens >= 1 and not self._waiters:
+            self._tokens -= 1
+            self.acquired += 1
+            return
+
+        ahead = sum(
+            1 for waiter in self._waiters if waiter[0] <= priority and not waiter[2].done()
+        )
+        delay = (ahead + 1 - self._tokens) / self.rate
+        if self.policy == POLICY_REJECT or (self.max_delay is not None and delay > self.max_delay):
+            self.rejected += 1
+            raise DingzRateLimitError("Request rate limit of dingz exceeded")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self.throttled += 1
+        self._schedule_wake_up()
+        await future
+        self.acquired += 1
+
+    def _schedule_wake_up(self) -> None:
+        """Serve the waiting requests once the next token is available."""
+        if self._wake_up is None and self._waiters:
+            delay = max(1 - self._tokens, 0) / self.rate
+            self._wake_up = asyncio.get_running_loop().call_later(delay, self._serve)
+
+    def _serve(self) -> None:
+        """Hand the available tokens to the waiting requests, highest priority first."""
+        self._wake_up = None
+        self._refill()
+        while self._waiters and self._tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+        self._schedule_wake_up()
+
+    @property
+    def statistics(self) -> dict:
+        """Return the throttle counters."""
+        return {
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+        }
+
+
+def shared_token_bucket(host: str, rate: float, burst: int = 1, **kwargs) -> TokenBucket:
+    """
+    Return the token bucket shared by all clients of ``host`` in this process.
+
+    The bucket is created with the given settings on the first call, later
+    calls return it unchanged.
+    """
+    bucket = _SHARED.get(host)
+    if bucket is None:
+        bucket = _SHARED[host] = TokenBucket(rate, burst, **kwargs)
+    return bucket
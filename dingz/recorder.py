@@ -0,0 +1,120 @@
+"""Record the sensor readings of a dingz unit over time."""
+import bisect
+import csv
+import math
+import time
+from array import array
+from typing import Dict, Optional
+
+LIGHT_STATES = {"night": 0, "day": 1}
+
+
+class SensorRecorder(object):
+    """
+    Keep the last readings of the dingz sensors in fixed-size ring buffers.
+
+    Every column is stored in its own typed array, so the memory used by the
+    recorder is allocated once and does not grow with the uptime.
+
+    >>> recorder = SensorRecorder(capacity=8640)  # one day at 10 s polling
+    >>> dingz = Dingz("192.168.0.103", recorder=recorder)
+    """
+
+    def __init__(self, capacity: int = 8640) -> None:
+        """Initialize the recorder.
+
+        :param capacity: number of readings kept before the oldest are overwritten.
+        """
+        if capacity < 1:
+            raise ValueError("invalid capacity %s, expected a positive value" % repr(capacity))
+
+        self.capacity = capacity
+        self._timestamp = array("d", [0.0]) * capacity
+        self._temperature = array("d", [0.0]) * capacity
+        self._brightness = array("d", [0.0]) * capacity
+        self._light_state = array("b", [0]) * capacity
+        self._motion = array("b", [0]) * capacity
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        """Return the number of readings currently held."""
+        return self._count
+
+    def record(
+        self, temperature, brightness, light_state, motion, timestamp: Optional[float] = None
+    ) -> None:
+        """Append a reading, overwriting the oldest one if the buffers are full."""
+        index = self._next
+        self._timestamp[index] = time.time() if timestamp is None else timestamp
+        self._temperature[index] = math.nan if temperature is None else temperature
+        self._brightness[index] = math.nan if brightness is None else brightness
+        self._light_state[index] = LIGHT_STATES.get(light_state, -1)
+        self._motion[index] = 1 if motion else 0
+
+        self._next = (index + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def _ordered(self, column: array) -> array:
+        """Return a copy of the column with the oldest reading first."""
+        if self._count < self.capacity:
+            return column[: self._count]
+        return column[self._next :] + column[: self._next]
+
+    def columns(self, since: Optional[float] = None) -> Dict[str, array]:
+        """
+        Return all readings in chronological order, one typed array per column.
+
+        The arrays support the buffer protocol and can be handed to columnar
+        writers (e.g. ``numpy.frombuffer``) without converting every sample.
+
+        :param since: only return readings taken at or after this UNIX timestamp.
+        """
+        timestamps = self._ordered(self._timestamp)
+        start = 0 if since is None else bisect.bisect_left(timestamps, since)
+        return {
+            "timestamp": timestamps[start:],
+            "temperature": self._ordered(self._temperature)[start:],
+            "brightness": self._ordered(self._brightness)[start:],
+            "light_state": self._ordered(self._light_state)[start:],
+            "motion": self._ordered(self._motion)[start:],
+        }
+
+    def statistics(self, window: Optional[float] = None) -> dict:
+        """
+        Return aggregates over the recorded readings.
+
+        :param window: only consider the readings of the last ``window`` seconds.
+        :return: min/max/mean of temperature and brightness and the motion duty
+                 cycle (share of readings with a person present).
+        """
+        since = None if window is None else time.time() - window
+        columns = self.columns(since=since)
+        samples = len(columns["timestamp"])
+
+        result = {"samples": samples}
+        for name in ("temperature", "brightness"):
+            values = [value for value in columns[name] if not math.isnan(value)]
+            if values:
+                result[name] = {
+                    "min": min(values),
+                    "max": max(values),
+                    "mean": sum(values) / len(values),
+                }
+            else:
+                result[name] = None
+        result["motion_duty_cycle"] = sum(columns["motion"]) / samples if samples else None
+        return result
+
+    def export_csv(self, path: str, since: Optional[float] = None) -> None:
+        """Write the recorded readings to a CSV file, one column per sensor."""
+        columns = self.columns(since=since)
+        with open(path, "w", newline="", encoding="utf-8") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(columns.keys())
+            writer.writerows(zip(*columns.values()))
+
+    def clear(self) -> None:
+        """Drop all recorded readings."""
+        self._next = 0
+        self._count = 0
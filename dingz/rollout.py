@@ -0,0 +1,222 @@
+"""Roll out firmware images to many dingz units in waves."""
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from .discovery import DeviceRegistry, DiscoveredDevice, DiscoveryListener, normalize_mac
+from .dingz import Dingz
+from .exceptions import DingzError, DingzFirmwareError
+from .fleet import DingzFleet
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RestartWatcher(DeviceRegistry):
+    """
+    Device registry which reports units announcing a restart.
+
+    Units are identified by their MAC address, as they may get another IP
+    address after the restart.
+    """
+
+    def __init__(self):
+        """Initialize the watcher."""
+        super().__init__()
+        self._waiters: Dict[str, asyncio.Future] = {}
+
+    def register(self, device: DiscoveredDevice) -> None:
+        """Register a device and wake up who waits for its restart."""
+        super().register(device)
+        waiter = self._waiters.get(device.mac)
+        if waiter is not None and device.restarted and not waiter.done():
+            waiter.set_result(device)
+
+    def expect_restart(self, mac: str) -> asyncio.Future:
+        """Return a future resolved with the device at its next restart announcement."""
+        waiter = self._waiters[normalize_mac(mac)] = asyncio.get_running_loop().create_future()
+        return waiter
+
+    def forget(self, mac: str) -> None:
+        """Stop waiting for a restart of the unit."""
+        self._waiters.pop(normalize_mac(mac), None)
+
+
+class RolloutReport(object):
+    """Outcome of a firmware rollout."""
+
+    def __init__(self):
+        """Initialize the report."""
+        self.updated: List[str] = []
+        self.up_to_date: List[str] = []
+        self.failed: Dict[str, Exception] = {}
+        self.skipped: List[str] = []
+        self.halted = False
+
+    def __repr__(self) -> str:
+        """Return a summary of the rollout."""
+        return "<RolloutReport updated=%s up_to_date=%s failed=%s skipped=%s halted=%s>" % (
+            len(self.updated),
+            len(self.up_to_date),
+            len(self.failed),
+            len(self.skipped),
+            self.halted,
+        )
+
+
+class FirmwareRollout(object):
+    """
+    Upgrade the firmware of a fleet in waves.
+
+    Every unit of a wave gets the image uploaded, is expected to announce its
+    restart in the UDP broadcast and must then report the expected firmware
+    version. As soon as the share of failed units of a wave exceeds
+    ``max_failure_rate`` no further unit is started and the rollout stops,
+    the units not started are reported as skipped.
+    """
+
+    def __init__(
+        self,
+        fleet: DingzFleet,
+        image: str,
+        version: str,
+        wave_size: int = 10,
+        parallelism: int = 5,
+        max_failure_rate: float = 0.2,
+        restart_timeout: int = 300,
+        wait_for_discovery: bool = True,
+    ) -> None:
+        """Initialize the rollout.
+
+        :param fleet: units to upgrade
+        :param image: path to the firmware image
+        :param version: firmware version reported by the units after the upgrade
+        :param wave_size: number of units per wave
+        :param parallelism: number of units upgraded at the same time
+        :param max_failure_rate: share of failed units that halts the rollout
+        :param restart_timeout: seconds a unit may take to come back
+        :param wait_for_discovery: wait for the restart announcement, disable
+                                   if the units are not in the local network
+        """
+        self.fleet = fleet
+        self.image = image
+        self.version = version
+        self.wave_size = wave_size
+        self.parallelism = parallelism
+        self.max_failure_rate = max_failure_rate
+        self.restart_timeout = restart_timeout
+        self.wait_for_discovery = wait_for_discovery
+        self._watcher = RestartWatcher()
+
+    def waves(self) -> List[List[str]]:
+        """Return the hosts of the fleet split into waves."""
+        hosts = self.fleet.hosts
+        return [hosts[i : i + self.wave_size] for i in range(0, len(hosts), self.wave_size)]
+
+    async def run(self) -> RolloutReport:
+        """Run the rollout wave by wave."""
+        report = RolloutReport()
+        listener = None
+        if self.wait_for_discovery:
+            listener = await DiscoveryListener.subscribe(self._watcher)
+
+        try:
+            waves = self.waves()
+            for number, wave in enumerate(waves, start=1):
+                _LOGGER.info("Starting wave %s/%s with %s units", number, len(waves), len(wave))
+                results = await self._run_wave(wave)
+                failures = 0
+                for host, result in results.items():
+                    if isinstance(result, BaseException):
+                        _LOGGER.warning("Upgrade of %s failed: %s", host, result)
+                        report.failed[host] = result
+                        failures += 1
+                    elif result is None:
+                        report.skipped.append(host)
+                    elif result:
+                        report.updated.append(host)
+                    else:
+                        report.up_to_date.append(host)
+
+                if failures / len(wave) > self.max_failure_rate:
+                    _LOGGER.error("Halting rollout, %s of %s units failed", failures, len(wave))
+                    report.halted = True
+                    report.skipped.extend(host for later in waves[number:] for host in later)
+                    break
+        finally:
+            if listener is not None:
+                listener.unsubscribe(self._watcher)
+
+        return report
+
+    async def _run_wave(self, wave: List[str]) -> Dict[str, Optional[bool]]:
+        """
+        Upgrade the units of a wave, return the result or exception per host.
+
+        Once the failed units exceed ``max_failure_rate`` of the wave no further
+        unit is started, the result of the units not started is None.
+        """
+        failures = 0
+
+        async def upgrade(dingz: Dingz) -> Optional[bool]:
+            nonlocal failures
+            if failures / len(wave) > self.max_failure_rate:
+                return None
+            try:
+                return await self._upgrade(dingz)
+            except Exception:
+                failures += 1
+                raise
+
+        return await self.fleet.run(upgrade, hosts=wave, concurrency=self.parallelism)
+
+    async def _upgrade(self, dingz: Dingz) -> bool:
+        """Upgrade a single unit, return False if it already runs the version."""
+        await dingz.get_device_info()
+        if dingz.fw_version == self.version:
+            return False
+
+        host = dingz.host
+        if not self.wait_for_discovery:
+            await dingz.upload_firmware(self.image)
+        else:
+            await dingz.get_info()
+            # Armed before the upload, the unit may announce its restart right after it
+            restarted = self._watcher.expect_restart(dingz.mac)
+            try:
+                await dingz.upload_firmware(self.image)
+                _LOGGER.debug("Uploaded firmware to %s, waiting for restart", host)
+                try:
+                    device = await asyncio.wait_for(restarted, self.restart_timeout)
+                except asyncio.TimeoutError as exception:
+                    raise DingzFirmwareError(
+                        "%s was not discovered after the upgrade" % host
+                    ) from exception
+            finally:
+                self._watcher.forget(dingz.mac)
+
+            if device.host != host:
+                _LOGGER.info("%s came back with the address %s", host, device.host)
+                dingz = self.fleet.get(device.host)
+
+        await self._wait_for_version(dingz)
+        if dingz.fw_version != self.version:
+            raise DingzFirmwareError(
+                "%s reports firmware %s instead of %s" % (host, dingz.fw_version, self.version)
+            )
+        return True
+
+    async def _wait_for_version(self, dingz: Dingz) -> None:
+        """Fetch the device details until the unit reports the new version."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.restart_timeout
+        while True:
+            try:
+                await dingz.get_device_info()
+                if dingz.fw_version == self.version:
+                    return
+            except DingzError:
+                if loop.time() > deadline:
+                    raise
+            if loop.time() > deadline:
+                return
+            await asyncio.sleep(5)
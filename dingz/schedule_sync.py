@@ -0,0 +1,128 @@
+"""Keep the schedules and timers of many dingz units in sync."""
+import logging
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+from .dingz import Dingz
+from .fleet import DingzFleet
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def entries_by_id(entries: Any) -> Dict[Hashable, dict]:
+    """Return schedule or timer entries keyed by their ``id`` (or position)."""
+    if not entries:
+        return {}
+    if isinstance(entries, dict):
+        return dict(entries)
+    return {entry.get("id", index): entry for index, entry in enumerate(entries)}
+
+
+class EntriesDiff(object):
+    """Difference between the current and the desired entries of a section."""
+
+    def __init__(self, current: Any, desired: Any) -> None:
+        """Initialize the diff."""
+        current = entries_by_id(current)
+        desired = entries_by_id(desired)
+        self.added = {key: entry for key, entry in desired.items() if key not in current}
+        self.changed = {
+            key: entry
+            for key, entry in desired.items()
+            if key in current and current[key] != entry
+        }
+        self.removed = {key: entry for key, entry in current.items() if key not in desired}
+
+    def __bool__(self) -> bool:
+        """Return true if the section differs."""
+        return bool(self.added or self.changed or self.removed)
+
+    def __repr__(self) -> str:
+        """Return a summary of the diff."""
+        return "+%s ~%s -%s" % (len(self.added), len(self.changed), len(self.removed))
+
+
+class ScheduleDiff(object):
+    """Difference of the schedule and the timers of a single unit."""
+
+    def __init__(self, host: str, schedule: EntriesDiff, timers: EntriesDiff) -> None:
+        """Initialize the diff."""
+        self.host = host
+        self.schedule = schedule
+        self.timers = timers
+        self.applied = False
+
+    def __bool__(self) -> bool:
+        """Return true if anything differs."""
+        return bool(self.schedule or self.timers)
+
+    def __repr__(self) -> str:
+        """Return a summary of the diff."""
+        return "<ScheduleDiff %s schedule=%r timers=%r applied=%s>" % (
+            self.host,
+            self.schedule,
+            self.timers,
+            self.applied,
+        )
+
+
+async def sync_device(
+    dingz: Dingz,
+    schedule: Optional[Iterable[dict]] = None,
+    timers: Optional[Iterable[dict]] = None,
+    dry_run: bool = False,
+) -> ScheduleDiff:
+    """
+    Bring the schedule and the timers of a unit to the desired state.
+
+    Only the sections given are compared. The schedule is replaced as a whole
+    if any of its entries differ, timers are set or stopped one by one.
+
+    :param schedule: desired schedule entries, ``None`` to leave the schedule alone
+    :param timers: desired timers, ``None`` to leave the timers alone
+    :param dry_run: only compute the diff
+    """
+    schedule_diff = EntriesDiff(None, None)
+    timers_diff = EntriesDiff(None, None)
+    if schedule is not None:
+        schedule = list(schedule)
+        await dingz.get_schedule()
+        schedule_diff = EntriesDiff(dingz.schedule, schedule)
+    if timers is not None:
+        timers = list(timers)
+        await dingz.get_timer()
+        timers_diff = EntriesDiff(dingz.timer, timers)
+
+    diff = ScheduleDiff(dingz.host, schedule_diff, timers_diff)
+    if dry_run or not diff:
+        return diff
+
+    _LOGGER.debug("Applying %r", diff)
+    if schedule_diff:
+        await dingz.set_schedule(schedule)
+    for timer in timers_diff.removed.values():
+        await dingz.stop_timer(timer)
+    for timer in list(timers_diff.added.values()) + list(timers_diff.changed.values()):
+        await dingz.set_timer(timer)
+    diff.applied = True
+    return diff
+
+
+async def sync_schedules(
+    fleet: DingzFleet,
+    schedule: Optional[Iterable[dict]] = None,
+    timers: Optional[Iterable[dict]] = None,
+    dry_run: bool = False,
+    concurrency: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Bring the schedule and the timers of every unit of a fleet to the desired state.
+
+    :return: the ``ScheduleDiff``, or the raised exception, per host
+    """
+    schedule = None if schedule is None else list(schedule)
+    timers = None if timers is None else list(timers)
+
+    async def sync(dingz: Dingz) -> ScheduleDiff:
+        return await sync_device(dingz, schedule, timers, dry_run)
+
+    return await fleet.run(sync, concurrency=concurrency)
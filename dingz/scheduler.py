@@ -0,0 +1,116 @@
+"""Schedule the requests sent to a dingz unit."""
+import asyncio
+import heapq
+import itertools
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, List
+
+# Priority classes, lower values are sent first
+PRIORITY_COMMAND = 0
+PRIORITY_STATE = 1
+PRIORITY_CONFIG = 2
+
+
+class _QueuedRequest(object):
+    """A request waiting for a free slot."""
+
+    __slots__ = ("priority", "sequence", "future", "dropped")
+
+    def __init__(self, priority, sequence, future):
+        self.priority = priority
+        self.sequence = sequence
+        self.future = future
+        self.dropped = False
+
+    def __lt__(self, other: "_QueuedRequest") -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class RequestScheduler(object):
+    """
+    Limit the requests in flight to a single dingz unit.
+
+    The embedded HTTP server of a dingz only handles a few connections at a
+    time. Requests above ``max_in_flight`` are queued and sent by priority
+    class (commands before state polls before configuration fetches). A queued
+    request whose caller is cancelled is dropped and never sent. Identical
+    state polls are already shared by ``make_call`` before they are queued.
+    """
+
+    def __init__(self, max_in_flight: int = 2) -> None:
+        """Initialize the scheduler."""
+        if max_in_flight < 1:
+            raise ValueError(
+                "invalid max_in_flight %s, expected a positive value" % repr(max_in_flight)
+            )
+
+        self.max_in_flight = max_in_flight
+        self._in_flight = 0
+        self._queue: List[_QueuedRequest] = []
+        self._sequence = itertools.count()
+
+    @property
+    def in_flight(self) -> int:
+        """Return the number of requests currently sent."""
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        """Return the number of requests waiting for a slot."""
+        return sum(1 for request in self._queue if not request.dropped)
+
+    async def submit(
+        self, factory: Callable[[], Awaitable[Any]], priority: int = PRIORITY_STATE
+    ) -> Any:
+        """
+        Run the request created by ``factory`` as soon as a slot is free.
+
+        :param factory: callable returning the awaitable doing the request
+        :param priority: one of the ``PRIORITY_*`` classes
+        :return: the result of the request
+        """
+        async with self.slot(priority):
+            return await factory()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_STATE) -> AsyncIterator[None]:
+        """
+        Hold a slot while the block runs, e.g. for a streamed response.
+
+        :param priority: one of the ``PRIORITY_*`` classes
+        """
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: int) -> None:
+        """Wait for a free slot and take it."""
+        if self._in_flight < self.max_in_flight and not self._queue:
+            self._in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        request = _QueuedRequest(priority, next(self._sequence), future)
+        heapq.heappush(self._queue, request)
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Nobody waits for the request any more, it must not be sent later
+            request.dropped = True
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before the cancellation
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        """Free a slot and hand it to the next queued request."""
+        self._in_flight -= 1
+        while self._queue:
+            request = heapq.heappop(self._queue)
+            if request.dropped:
+                continue
+            self._in_flight += 1
+            request.future.set_result(None)
+            break
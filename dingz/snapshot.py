@@ -0,0 +1,116 @@
+"""Immutable snapshots of the state of a dingz unit."""
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+
+class SensorSnapshot(NamedTuple):
+    """Readings of the sensors of a dingz."""
+
+    temperature: Optional[float]
+    brightness: Optional[float]
+    light_state: Optional[str]
+    motion: bool
+
+    @classmethod
+    def from_json(cls, sensors: dict) -> "SensorSnapshot":
+        """Create a snapshot from the ``sensors`` part of the state."""
+        return cls(
+            sensors.get("room_temperature"),
+            sensors.get("brightness"),
+            sensors.get("light_state"),
+            sensors.get("person_present") == 1,
+        )
+
+
+class DimmerSnapshot(NamedTuple):
+    """State of a dimmer output."""
+
+    absolute_index: int
+    relative_index: int
+    on: bool
+    output: int
+    ramp: int
+    readonly: bool
+
+    @classmethod
+    def from_json(cls, dimmer: dict) -> "DimmerSnapshot":
+        """Create a snapshot from an entry of the ``dimmers`` list of the state."""
+        index = dimmer["index"]
+        return cls(
+            index["absolute"],
+            index["relative"],
+            dimmer["on"],
+            dimmer["output"],
+            dimmer.get("ramp", 0),
+            dimmer.get("readonly", False),
+        )
+
+
+class ShadeSnapshot(NamedTuple):
+    """State of a shade output."""
+
+    absolute_index: int
+    relative_index: int
+    moving: str
+    position: int
+    lamella: int
+    readonly: bool
+
+    @classmethod
+    def from_json(cls, blind: dict, shade: Optional[dict] = None) -> "ShadeSnapshot":
+        """
+        Create a snapshot from an entry of the ``blinds`` list of the state.
+
+        :param shade: the entry of the shade endpoint for the same output, its
+                      current position is more accurate during movements
+        """
+        if shade is not None:
+            position, lamella = shade["current"]["blind"], shade["current"]["lamella"]
+        else:
+            position, lamella = blind["position"], blind["lamella"]
+
+        index = blind["index"]
+        return cls(
+            index["absolute"],
+            index["relative"],
+            blind["moving"],
+            position,
+            lamella,
+            blind.get("readonly", False),
+        )
+
+
+class StateSnapshot(NamedTuple):
+    """
+    State of a dingz unit at the time of a poll.
+
+    Snapshots are tuples: they are immutable, compare by value, can be shared
+    between threads without copying and need far less memory than the JSON
+    they are built from.
+    """
+
+    sensors: SensorSnapshot
+    dimmers: Tuple[DimmerSnapshot, ...]
+    shades: Tuple[ShadeSnapshot, ...]
+
+    @classmethod
+    def from_json(
+        cls, state: dict, shade_states: Optional[Iterable[dict]] = None
+    ) -> "StateSnapshot":
+        """
+        Create a snapshot from the response of the state endpoint.
+
+        :param state: response of the state endpoint
+        :param shade_states: values of the response of the shade endpoint, if fetched
+        """
+        shades_by_index = {}
+        if shade_states is not None:
+            shades_by_index = {shade["index"]["absolute"]: shade for shade in shade_states}
+
+        return cls(
+            SensorSnapshot.from_json(state["sensors"]),
+            tuple(DimmerSnapshot.from_json(dimmer) for dimmer in state["dimmers"]),
+            tuple(
+                ShadeSnapshot.from_json(blind, shades_by_index.get(blind["index"]["absolute"]))
+                for blind in state["blinds"]
+            ),
+        )
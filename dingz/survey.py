@@ -0,0 +1,262 @@
+"""Survey the WiFi reception of many dingz units."""
+import asyncio
+import logging
+import math
+import statistics
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+from .dingz import Dingz
+from .fleet import DingzFleet
+
+_LOGGER = logging.getLogger(__name__)
+
+# Stored for BSSIDs a unit did not see
+NO_SIGNAL = -128
+
+
+def parse_scan(networks: Any) -> Dict[str, int]:
+    """
+    Return the signal strength (dBm) per network of a scan result.
+
+    Networks are identified by their BSSID if the unit reports one, by
+    their SSID otherwise. Both a list of network objects and a flat list
+    alternating SSID and signal are understood.
+    """
+    if isinstance(networks, Mapping):
+        networks = next((value for value in networks.values() if isinstance(value, list)), [])
+    if not isinstance(networks, list):
+        return {}
+
+    signals = {}
+    if networks and not isinstance(networks[0], Mapping):
+        pairs = zip(networks[0::2], networks[1::2])
+    else:
+        pairs = (
+            (
+                network.get("bssid") or network.get("mac") or network.get("ssid"),
+                next(
+                    (network[key] for key in ("signal", "rssi", "rssi_dbm") if key in network),
+                    None,
+                ),
+            )
+            for network in networks
+            if isinstance(network, Mapping)
+        )
+    for name, signal in pairs:
+        try:
+            signal = int(signal)
+        except (TypeError, ValueError):
+            continue
+        if name:
+            name = str(name).lower()
+            signals[name] = max(signal, signals.get(name, NO_SIGNAL))
+    return signals
+
+
+class SignalMatrix(object):
+    """
+    Signal strength of every network as seen from every unit.
+
+    The values are kept in a single array of signed bytes, one row per unit
+    and one column per BSSID, ``NO_SIGNAL`` where a unit did not see a network.
+    """
+
+    def __init__(self, scans: Mapping[str, Mapping[str, int]]) -> None:
+        """Initialize the matrix from the parsed scan per host."""
+        self.hosts: List[str] = list(scans)
+        self.bssids: List[str] = sorted({bssid for signals in scans.values() for bssid in signals})
+        self._columns = {bssid: index for index, bssid in enumerate(self.bssids)}
+        self._rows = {host: index for index, host in enumerate(self.hosts)}
+        self._values = array("b", [NO_SIGNAL]) * (len(self.hosts) * len(self.bssids))
+        for host, signals in scans.items():
+            offset = self._rows[host] * len(self.bssids)
+            for bssid, signal in signals.items():
+                self._values[offset + self._columns[bssid]] = max(min(signal, 127), NO_SIGNAL)
+
+    def get(self, host: str, bssid: str) -> Optional[int]:
+        """Return the signal of a network seen from a unit, None if not seen."""
+        if host not in self._rows or bssid not in self._columns:
+            return None
+        value = self._values[self._rows[host] * len(self.bssids) + self._columns[bssid]]
+        return None if value == NO_SIGNAL else value
+
+    def row(self, host: str) -> Dict[str, int]:
+        """Return the networks seen from a unit with their signal."""
+        offset = self._rows[host] * len(self.bssids)
+        return {
+            bssid: self._values[offset + index]
+            for index, bssid in enumerate(self.bssids)
+            if self._values[offset + index] != NO_SIGNAL
+        }
+
+    def strongest(self, host: str) -> Tuple[Optional[str], Optional[int]]:
+        """Return the strongest network seen from a unit and its signal."""
+        signals = self.row(host) if host in self._rows else {}
+        if not signals:
+            return None, None
+        bssid = max(signals, key=signals.get)
+        return bssid, signals[bssid]
+
+
+def correlation(xs: List[float], ys: List[float]) -> Optional[float]:
+    """Return the Pearson correlation coefficient, None if it is undefined."""
+    if len(xs) < 2:
+        return None
+    mean_x, mean_y = statistics.fmean(xs), statistics.fmean(ys)
+    covariance = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    spread = math.sqrt(
+        sum((x - mean_x) ** 2 for x in xs) * sum((y - mean_y) ** 2 for y in ys)
+    )
+    if spread == 0:
+        return None
+    return covariance / spread
+
+
+class SurveyResult(NamedTuple):
+    """Outcome of a WiFi survey."""
+
+    matrix: SignalMatrix
+    latency: Dict[str, float]
+    failed: Dict[str, Exception]
+
+    def signal_latency_correlation(self) -> Optional[float]:
+        """
+        Return the correlation between the best signal and the latency of the units.
+
+        A strongly negative value means units with a weak signal respond slowly.
+        """
+        pairs = [
+            (self.matrix.strongest(host)[1], latency)
+            for host, latency in self.latency.items()
+            if self.matrix.strongest(host)[1] is not None
+        ]
+        return correlation([signal for signal, _ in pairs], [latency for _, latency in pairs])
+
+    def suspects(self, min_signal: int = -70) -> List[Tuple[str, Optional[int], float]]:
+        """
+        Return the units whose best signal is below ``min_signal``, slowest first.
+
+        :return: host, best signal and latency in seconds per unit
+        """
+        suspects = []
+        for host, latency in self.latency.items():
+            signal = self.matrix.strongest(host)[1]
+            if signal is None or signal < min_signal:
+                suspects.append((host, signal, latency))
+        return sorted(suspects, key=lambda suspect: suspect[2], reverse=True)
+
+
+def _successful(results: Dict[str, Any], failed: Dict[str, Exception], step: str) -> Dict[str, Any]:
+    """Return the successful results, add the exceptions to ``failed``."""
+    successful = {}
+    for host, result in results.items():
+        if isinstance(result, BaseException):
+            _LOGGER.warning("Could not survey %s (%s): %s", host, step, result)
+            failed[host] = result
+        else:
+            successful[host] = result
+    return successful
+
+
+class WifiSurvey(object):
+    """
+    Scan for WiFi networks from all units of a fleet at the same time.
+
+    A scan takes the radio of a unit off its channel for a moment, so only
+    ``scans_per_ap`` units associated with the same access point scan at
+    once. The access point of a unit is taken from ``access_points`` or the
+    strongest BSSID of the previous survey, the dingz API does not report
+    it. Units with an unknown access point, e.g. all of them on the first
+    survey, are limited to ``scans_unknown_ap`` concurrent scans: they are
+    spread over several access points in most installations, but nothing
+    tells which of them share one. Pass ``access_points`` or run a second
+    survey to scan by access point.
+
+    The latency of all units is measured first, while none of them scans.
+
+    >>> survey = WifiSurvey(fleet)
+    >>> result = await survey.run()
+    >>> result.signal_latency_correlation()
+    """
+
+    def __init__(
+        self,
+        fleet: DingzFleet,
+        concurrency: int = 10,
+        scans_per_ap: int = 1,
+        scans_unknown_ap: int = 4,
+        latency_samples: int = 3,
+        access_points: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        """Initialize the survey.
+
+        :param concurrency: maximal number of units surveyed at once
+        :param scans_per_ap: maximal number of units of the same access point scanning at once
+        :param scans_unknown_ap: maximal number of units with an unknown access point
+                                 scanning at once
+        :param latency_samples: requests timed per unit, the median is kept
+        :param access_points: access point per host, overrides the previous survey
+        """
+        if scans_per_ap < 1:
+            raise ValueError(
+                "invalid scans_per_ap %s, expected a positive value" % repr(scans_per_ap)
+            )
+        if scans_unknown_ap < 1:
+            raise ValueError(
+                "invalid scans_unknown_ap %s, expected a positive value" % repr(scans_unknown_ap)
+            )
+
+        self.fleet = fleet
+        self.concurrency = concurrency
+        self.scans_per_ap = scans_per_ap
+        self.scans_unknown_ap = scans_unknown_ap
+        self.latency_samples = latency_samples
+        self.access_points = dict(access_points or {})
+        self.result: Optional[SurveyResult] = None
+
+    def _access_point(self, host: str) -> Optional[str]:
+        """Return the access point a unit is presumably associated with."""
+        if host in self.access_points:
+            return self.access_points[host]
+        if self.result is not None:
+            return self.result.matrix.strongest(host)[0]
+        return None
+
+    async def _measure_latency(self, dingz: Dingz) -> float:
+        """Return the median time the unit takes to answer a small request."""
+        durations = []
+        for _ in range(self.latency_samples):
+            started = time.monotonic()
+            await dingz.get_info()
+            durations.append(time.monotonic() - started)
+        return statistics.median(durations)
+
+    async def run(self, hosts: Optional[Iterable[str]] = None) -> SurveyResult:
+        """Survey the units, all of the fleet if ``hosts`` is not given."""
+        limits: Dict[Optional[str], asyncio.Semaphore] = {}
+        failed: Dict[str, Exception] = {}
+
+        async def scan(dingz: Dingz) -> Dict[str, int]:
+            access_point = self._access_point(dingz.host)
+            limit = limits.get(access_point)
+            if limit is None:
+                allowed = self.scans_per_ap if access_point is not None else self.scans_unknown_ap
+                limit = limits[access_point] = asyncio.Semaphore(allowed)
+            async with limit:
+                await dingz.get_wifi_networks()
+            return parse_scan(dingz.wifi_networks)
+
+        # Scans disturb the WiFi, so all latencies are measured before the first scan
+        results = await self.fleet.run(
+            self._measure_latency, hosts=hosts, concurrency=self.concurrency
+        )
+        latency = _successful(results, failed, "latency")
+        results = await self.fleet.run(scan, hosts=list(latency), concurrency=self.concurrency)
+        scans = _successful(results, failed, "scan")
+        # Units failing the scan have no place in the correlation either
+        latency = {host: latency[host] for host in scans}
+
+        self.result = SurveyResult(SignalMatrix(scans), latency, failed)
+        return self.result
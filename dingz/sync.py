@@ -0,0 +1,154 @@
+"""Blocking access to dingz units for code without an event loop."""
+import asyncio
+import functools
+import inspect
+import threading
+from typing import Any, AsyncIterator, Coroutine, Dict, Iterator, Optional, Tuple
+
+import aiohttp
+
+from .dimmer import Dimmer, DimmerRegistry
+from .dingz import Dingz
+from .shade import Shade, ShadeRegistry
+
+# Objects returned by a proxy are wrapped themselves, so their commands block as well
+_WRAPPED_TYPES = (Dimmer, DimmerRegistry, Shade, ShadeRegistry)
+
+
+class _BlockingProxy(object):
+    """
+    Expose the coroutine methods of an object as blocking methods.
+
+    Async generator methods (e.g. ``stream_log``) return blocking iterators.
+    """
+
+    def __init__(self, client: "SyncClient", target: Any) -> None:
+        self._client = client
+        self._target = target
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._target, name)
+        if inspect.iscoroutinefunction(attribute):
+
+            @functools.wraps(attribute)
+            def blocking(*args, **kwargs):
+                return self._client.run(attribute(*args, **kwargs))
+
+            return blocking
+        if inspect.isasyncgenfunction(attribute):
+
+            @functools.wraps(attribute)
+            def iterate(*args, **kwargs):
+                return self._client.iterate(attribute(*args, **kwargs))
+
+            return iterate
+        if callable(attribute):
+
+            @functools.wraps(attribute)
+            def wrapped(*args, **kwargs):
+                return self._client._wrap(attribute(*args, **kwargs))
+
+            return wrapped
+        return self._client._wrap(attribute)
+
+    def __repr__(self) -> str:
+        return "<blocking %r>" % self._target
+
+
+async def _next_item(iterator: AsyncIterator) -> Tuple[bool, Any]:
+    """Return whether the iterator had another item, and the item."""
+    try:
+        return True, await iterator.__anext__()
+    except StopAsyncIteration:
+        return False, None
+
+
+class SyncClient(object):
+    """
+    Run the dingz client in a background event loop thread.
+
+    The loop and its connection pool live as long as the client, so
+    synchronous callers (e.g. WSGI or task queue workers) do not pay for a new
+    loop and session per operation. The client can be shared between threads.
+
+    >>> with SyncClient() as client:
+    ...     dingz = client.dingz("192.168.0.103")
+    ...     dingz.get_state()
+    ...     dingz.dimmers.get(0).turn_on(brightness_pct=70)
+    """
+
+    def __init__(self, limit_per_host: int = 2) -> None:
+        """Initialize the client and start its event loop thread.
+
+        :param limit_per_host: connections kept open to a single unit
+        """
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="dingz-sync-client", daemon=True
+        )
+        self._thread.start()
+        self._lock = threading.Lock()
+        self._devices: Dict[str, Dingz] = {}
+        self._session: Optional[aiohttp.ClientSession] = self.run(
+            self._create_session(limit_per_host)
+        )
+
+    @staticmethod
+    async def _create_session(limit_per_host: int) -> aiohttp.ClientSession:
+        """Create the session inside the event loop."""
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=limit_per_host)
+        )
+
+    def run(self, coroutine: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine in the event loop of the client and wait for its result."""
+        if self._loop.is_closed():
+            coroutine.close()
+            raise RuntimeError("The client is closed")
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result(timeout)
+
+    def iterate(self, iterator: AsyncIterator) -> Iterator:
+        """Iterate over an async iterator in the event loop of the client."""
+        try:
+            while True:
+                has_item, item = self.run(_next_item(iterator))
+                if not has_item:
+                    return
+                yield item
+        finally:
+            # Also release e.g. the response when the caller stops early
+            if hasattr(iterator, "aclose") and not self._loop.is_closed():
+                self.run(iterator.aclose())
+
+    def dingz(self, host: str) -> Any:
+        """Return a blocking client of a dingz unit."""
+        with self._lock:
+            dingz = self._devices.get(host)
+            if dingz is None:
+                dingz = self._devices[host] = Dingz(host, session=self._session)
+        return _BlockingProxy(self, dingz)
+
+    def _wrap(self, value: Any) -> Any:
+        """Wrap dimmers and shades (and their registries) in a blocking proxy."""
+        if isinstance(value, _WRAPPED_TYPES):
+            return _BlockingProxy(self, value)
+        if isinstance(value, list) and value and isinstance(value[0], _WRAPPED_TYPES):
+            return [_BlockingProxy(self, item) for item in value]
+        return value
+
+    def close(self) -> None:
+        """Close the session and stop the event loop thread."""
+        if self._loop.is_closed():
+            return
+        self.run(self._session.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self) -> "SyncClient":
+        """Enter."""
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Exit."""
+        self.close()
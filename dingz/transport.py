@@ -0,0 +1,336 @@
+"""Transports sending the requests of the client to dingz units."""
+import asyncio
+import base64
+import gzip
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Mapping, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode
+
+import aiohttp
+from yarl import URL
+
+from .constants import CONTENT_LENGTH, CONTENT_TYPE, CONTENT_TYPE_JSON
+from .exceptions import DingzNoDataAvailable
+
+
+class TransportResponse(NamedTuple):
+    """Response of a dingz unit as returned by a transport."""
+
+    status: int
+    content_type: str
+    body: bytes
+
+
+class Transport(ABC):
+    """
+    Base class of the transports used by ``make_call``.
+
+    A transport sends a single request and returns the complete response.
+    Connection problems are raised as ``aiohttp.ClientError``, ``OSError``
+    or ``asyncio.TimeoutError``.
+    """
+
+    @abstractmethod
+    async def request(
+        self,
+        method: str,
+        url: str,
+        headers: Mapping[str, str],
+        data: Optional[Any] = None,
+        json_data: Optional[Any] = None,
+        params: Optional[Mapping[str, str]] = None,
+    ) -> TransportResponse:
+        """Send a request and return the response."""
+
+    async def close(self) -> None:
+        """Release the resources of the transport."""
+
+
+class AiohttpTransport(Transport):
+    """Transport using an aiohttp client session."""
+
+    def __init__(self, session: aiohttp.ClientSession = None) -> None:
+        """Initialize the transport, a session is created if none is given."""
+        self._session = session
+        self._close_session = session is None
+
+    async def request(self, method, url, headers, data=None, json_data=None, params=None):
+        """Send a request and return the response."""
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        async with self._session.request(
+            method, url, data=data, json=json_data, params=params, headers=headers
+        ) as response:
+            body = await response.read()
+            return TransportResponse(response.status, response.headers.get(CONTENT_TYPE, ""), body)
+
+    async def close(self) -> None:
+        """Close the session if it was created by the transport."""
+        if self._session is not None and self._close_session:
+            await self._session.close()
+
+
+_Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+# Requests which may be sent again if a reused connection turns out to be closed
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+
+
+class _NothingReceived(Exception):
+    """The connection failed before any byte of the response arrived."""
+
+
+def _host_header(url: URL) -> str:
+    """Return the value of the Host header, with brackets for IPv6 and a non-default port."""
+    host = url.raw_host
+    if ":" in host:
+        host = f"[{host}]"
+    if url.port is not None and url.port != 80:
+        host = f"{host}:{url.port}"
+    return host
+
+
+def _parse_status(status_line: bytes) -> int:
+    """Return the status code of an HTTP/1.x status line."""
+    version, _, rest = status_line.partition(b" ")
+    if not version.startswith(b"HTTP/1."):
+        raise ValueError("Invalid status line %r" % status_line)
+    return int(rest[:3])
+
+
+class StreamTransport(Transport):
+    """
+    Minimal HTTP/1.1 client with persistent connections, built on asyncio streams.
+
+    It only covers what the dingz API needs (plain HTTP, small bodies with a
+    content length or chunked encoding) and therefore spends less CPU time
+    per request than a full client. Idle connections are kept per host and
+    reused for the next requests. Only idempotent requests are sent again
+    if a reused connection fails before any byte of the response arrived.
+    Malformed responses are raised as ``aiohttp.ClientPayloadError``.
+    """
+
+    def __init__(self, connections_per_host: int = 2) -> None:
+        """Initialize the transport.
+
+        :param connections_per_host: idle connections kept open per host
+        """
+        self.connections_per_host = connections_per_host
+        self._idle: Dict[Tuple[str, int], List[_Connection]] = defaultdict(list)
+
+    async def request(self, method, url, headers, data=None, json_data=None, params=None):
+        """Send a request and return the response."""
+        url = URL(url)
+        if url.scheme != "http":
+            raise ValueError("Only plain HTTP is supported, got %s" % url)
+        if params:
+            url = url.update_query(params)
+
+        request_headers = dict(headers)
+        if json_data is not None:
+            body = json.dumps(json_data).encode("utf-8")
+            request_headers[CONTENT_TYPE] = CONTENT_TYPE_JSON
+        elif isinstance(data, dict):
+            body = urlencode(data).encode("utf-8")
+            request_headers[CONTENT_TYPE] = "application/x-www-form-urlencoded"
+        elif isinstance(data, str):
+            body = data.encode("utf-8")
+        else:
+            body = data or b""
+        request_headers[CONTENT_LENGTH] = str(len(body))
+
+        lines = [f"{method} {url.raw_path_qs} HTTP/1.1", f"Host: {_host_header(url)}"]
+        lines.extend(f"{name}: {value}" for name, value in request_headers.items())
+        message = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+        address = (url.raw_host, url.port or 80)
+        idle = self._idle[address]
+        while idle:
+            reader, writer = idle.pop()
+            if reader.at_eof():
+                writer.close()
+                continue
+            try:
+                return await self._exchange(address, reader, writer, message)
+            except _NothingReceived as exception:
+                # The unit may have closed the idle connection, but whether it
+                # handled the request is unknown: only idempotent ones are repeated
+                if method not in IDEMPOTENT_METHODS:
+                    raise exception.__cause__
+
+        reader, writer = await asyncio.open_connection(*address)
+        try:
+            return await self._exchange(address, reader, writer, message)
+        except _NothingReceived as exception:
+            raise exception.__cause__
+
+    async def _exchange(self, address, reader, writer, message) -> TransportResponse:
+        """Send a request over a connection and read the response."""
+        try:
+            try:
+                writer.write(message)
+                await writer.drain()
+                status_line = await reader.readuntil(b"\r\n")
+            except (OSError, asyncio.IncompleteReadError) as exception:
+                if getattr(exception, "partial", b""):
+                    raise
+                raise _NothingReceived() from exception
+            status = _parse_status(status_line)
+
+            response_headers = {}
+            while True:
+                line = await reader.readuntil(b"\r\n")
+                if line == b"\r\n":
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                response_headers[name.strip().lower()] = value.strip()
+
+            if "chunked" in response_headers.get("transfer-encoding", "").lower():
+                chunks = []
+                while True:
+                    size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                    if size == 0:
+                        await reader.readuntil(b"\r\n")
+                        break
+                    chunks.append(await reader.readexactly(size))
+                    await reader.readexactly(2)
+                body = b"".join(chunks)
+                keep_alive = True
+            elif "content-length" in response_headers:
+                body = await reader.readexactly(int(response_headers["content-length"]))
+                keep_alive = True
+            else:
+                body = await reader.read()
+                keep_alive = False
+        except (ValueError, asyncio.LimitOverrunError) as exception:
+            writer.close()
+            raise aiohttp.ClientPayloadError(
+                "Malformed response from %s:%s" % address
+            ) from exception
+        except BaseException:
+            writer.close()
+            raise
+
+        keep_alive = keep_alive and response_headers.get("connection", "").lower() != "close"
+        idle = self._idle[address]
+        if keep_alive and len(idle) < self.connections_per_host:
+            idle.append((reader, writer))
+        else:
+            writer.close()
+
+        return TransportResponse(status, response_headers.get("content-type", ""), body)
+
+    async def close(self) -> None:
+        """Close all idle connections."""
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+
+def _request_key(method: str, url: str, params: Optional[Mapping[str, str]]) -> Tuple:
+    """Return what identifies a request for the replay."""
+    return method, str(url), tuple(sorted(params.items())) if params else ()
+
+
+def _encode_body(body: bytes) -> Dict[str, str]:
+    """Store a body as text if possible, base64 encoded otherwise."""
+    try:
+        return {"body": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body64": base64.b64encode(body).decode("ascii")}
+
+
+class RecordingTransport(Transport):
+    """
+    Transport recording all requests and responses passing through another one.
+
+    Every exchange is appended as a JSON line to a gzip compressed file: the
+    time since the recording started, the duration, method, URL, parameters,
+    request body, status, content type and response body.
+    """
+
+    def __init__(self, transport: Transport, path: str) -> None:
+        """Initialize the recorder.
+
+        :param transport: transport actually sending the requests
+        :param path: file the exchanges are written to
+        """
+        self.transport = transport
+        self.path = path
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._started = time.monotonic()
+
+    async def request(self, method, url, headers, data=None, json_data=None, params=None):
+        """Send a request through the wrapped transport and record it."""
+        started = time.monotonic()
+        response = await self.transport.request(method, url, headers, data, json_data, params)
+        record = {
+            "time": round(started - self._started, 6),
+            "duration": round(time.monotonic() - started, 6),
+            "method": method,
+            "url": str(url),
+            "params": dict(params) if params else None,
+            "request": json_data if json_data is not None else data,
+            "status": response.status,
+            "content_type": response.content_type,
+        }
+        record.update(_encode_body(response.body))
+        self._file.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+        return response
+
+    async def close(self) -> None:
+        """Finish the recording."""
+        self._file.close()
+
+
+class ReplayTransport(Transport):
+    """
+    Transport answering requests from a recording, without any network.
+
+    Responses to identical requests are served in the recorded order. With a
+    ``speed`` every response is delayed by its recorded duration divided by
+    the speed (1 replays in real time, 10 ten times faster), without it the
+    responses are served immediately.
+    """
+
+    def __init__(self, path: str, speed: Optional[float] = None, repeat: bool = False) -> None:
+        """Initialize the replay.
+
+        :param path: file written by ``RecordingTransport``
+        :param speed: replay speed relative to the recording, no delays if not given
+        :param repeat: start over with the first response once all were served
+        """
+        self.speed = speed
+        self.repeat = repeat
+        self._recorded: Dict[Tuple, list] = defaultdict(list)
+        with gzip.open(path, "rt", encoding="utf-8") as recording:
+            for line in recording:
+                record = json.loads(line)
+                key = _request_key(record["method"], record["url"], record["params"])
+                if "body64" in record:
+                    body = base64.b64decode(record["body64"])
+                else:
+                    body = record["body"].encode("utf-8")
+                response = TransportResponse(record["status"], record["content_type"], body)
+                self._recorded[key].append((record["duration"], response))
+        self._pending: Dict[Tuple, Deque] = {
+            key: deque(responses) for key, responses in self._recorded.items()
+        }
+
+    async def request(self, method, url, headers, data=None, json_data=None, params=None):
+        """Return the next recorded response to the request."""
+        key = _request_key(method, url, params)
+        pending = self._pending.get(key)
+        if not pending and self.repeat and key in self._recorded:
+            pending = self._pending[key] = deque(self._recorded[key])
+        if not pending:
+            raise DingzNoDataAvailable("No recorded response for %s %s" % (method, url))
+
+        duration, response = pending.popleft()
+        if self.speed:
+            await asyncio.sleep(duration / self.speed)
+        return response
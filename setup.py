@@ -20,6 +20,7 @@ setup(
     author_email="fabian@affolter-engineering.ch",
     license="Apache License 2.0",
     install_requires=["aiohttp<4", "async_timeout<5", "click", "setuptools"],
+    extras_require={"mqtt": ["aiomqtt>=2"]},
     packages=find_packages(),
     python_requires='>=3.9',
     zip_safe=True,
@@ -0,0 +1,132 @@
+"""Tests for the MQTT bridge, against stand-in units and the in-memory client."""
+import asyncio
+import json
+
+from aiohttp import web
+from yarl import URL
+
+from dingz.fleet import DingzFleet
+from dingz.mqtt import InMemoryClient, MqttBridge, topic_matches
+
+
+def make_state(temperature):
+    """Return the state of a unit with two dimmers and no shades."""
+    return {
+        "sensors": {
+            "brightness": 120.5,
+            "light_state": "day",
+            "room_temperature": temperature,
+            "person_present": 0,
+        },
+        "dimmers": [
+            {"on": False, "output": 0, "index": {"relative": index, "absolute": index}}
+            for index in range(2)
+        ],
+        "blinds": [],
+    }
+
+
+async def start_server(unit):
+    """Start a stand-in unit, return the runner and its URL."""
+
+    async def state(request):
+        return web.json_response(make_state(unit["temperature"]))
+
+    async def dimmer(request):
+        unit["commands"].append((request.path, dict(request.query)))
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_get("/api/v1/state", state)
+    app.router.add_post("/api/v1/dimmer/{index}/{action}", dimmer)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, URL(f"http://127.0.0.1:{port}/api/v1/")
+
+
+def run(coroutine_function):
+    """Run a bridge with one stand-in unit for the test."""
+
+    async def test():
+        unit = {"temperature": 21.5, "commands": []}
+        runner, uri = await start_server(unit)
+        try:
+            async with DingzFleet(["unit"]) as fleet:
+                fleet.get("unit").uri = uri
+                client = InMemoryClient()
+                bridge = MqttBridge(fleet, client, interval=0.02, batch_interval=0.02)
+                task = asyncio.ensure_future(bridge.run())
+                try:
+                    await asyncio.sleep(0.2)
+                    await coroutine_function(bridge, client, unit)
+                finally:
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(test())
+
+
+def test_changes_and_retained_state():
+    """Changed fields are published unretained, the complete state retained."""
+
+    async def check(bridge, client, unit):
+        state = json.loads(client.retained["dingz/unit/state"])
+        assert state["sensors.temperature"] == 21.5
+        assert state["dimmers.1.on"] is False
+        assert "dingz/unit/changes" not in client.retained
+
+        published = len(client.published)
+        unit["temperature"] = 22.0
+        await asyncio.sleep(0.2)
+
+        changes = [
+            json.loads(payload)
+            for topic, payload in client.published[published:]
+            if topic == "dingz/unit/changes"
+        ]
+        assert changes == [{"sensors.temperature": 22.0}]
+        assert json.loads(client.retained["dingz/unit/state"])["sensors.temperature"] == 22.0
+
+    run(check)
+
+
+def test_command_is_forwarded():
+    """A command on a dimmer topic is sent to the unit."""
+
+    async def check(bridge, client, unit):
+        client.inject("dingz/unit/dimmers/1/set", b'{"action": "on", "brightness_pct": 30}')
+        await asyncio.sleep(0.1)
+
+        assert unit["commands"] == [("/api/v1/dimmer/1/on", {"value": "30"})]
+
+    run(check)
+
+
+def test_unknown_index_is_ignored():
+    """Commands for dimmers the unit does not have neither reach it nor grow the registry."""
+
+    async def check(bridge, client, unit):
+        dimmers = bridge.fleet.get("unit").dimmers
+        known = len(dimmers._registry)
+        client.inject("dingz/unit/dimmers/99999/set", "on")
+        client.inject("dingz/unit/shades/7/set", '{"blind": 10}')
+        await asyncio.sleep(0.1)
+
+        assert unit["commands"] == []
+        assert len(dimmers._registry) == known
+        assert len(bridge.fleet.get("unit").shades._registry) == 0
+
+    run(check)
+
+
+def test_topic_matches():
+    """Single and multi level wildcards are matched."""
+    assert topic_matches("dingz/+/dimmers/+/set", "dingz/a/dimmers/0/set")
+    assert topic_matches("dingz/#", "dingz/a/shades/1/set")
+    assert not topic_matches("dingz/+/dimmers/+/set", "dingz/a/shades/0/set")
+    assert not topic_matches("dingz/+", "dingz/a/b")
@@ -0,0 +1,35 @@
+"""Tests for the encoding of the deltas sent by the poller workers."""
+import pickle
+
+from dingz.poller import _DeltaDecoder, _DeltaEncoder
+
+
+def test_deltas_round_trip():
+    """Deltas of several workers are decoded to the hosts and fields they were built from."""
+    shards = [["10.0.0.1", "10.0.0.3"], ["10.0.0.2"]]
+    encoders = [_DeltaEncoder(number, hosts) for number, hosts in enumerate(shards)]
+    decoder = _DeltaDecoder(shards)
+
+    encoders[0].add("10.0.0.3", {"available": True, "sensors.temperature": 21.5})
+    encoders[1].add("10.0.0.2", {"dimmers.0.on": False})
+    first = [pickle.loads(pickle.dumps(encoder.pop_batch())) for encoder in encoders]
+    encoders[0].add("10.0.0.1", {"sensors.temperature": 19.0, "dimmers.1.output": 40})
+    second = encoders[0].pop_batch()
+
+    assert list(decoder.decode(first[0])) == [
+        ("10.0.0.3", {"available": True, "sensors.temperature": 21.5})
+    ]
+    assert list(decoder.decode(first[1])) == [("10.0.0.2", {"dimmers.0.on": False})]
+    assert list(decoder.decode(second)) == [
+        ("10.0.0.1", {"sensors.temperature": 19.0, "dimmers.1.output": 40})
+    ]
+
+
+def test_paths_are_sent_once():
+    """A field path is only part of the first batch using it."""
+    encoder = _DeltaEncoder(0, ["10.0.0.1"])
+    encoder.add("10.0.0.1", {"sensors.temperature": 21.5})
+    assert encoder.pop_batch() == (0, ["sensors.temperature"], [(0, 0, 21.5)])
+
+    encoder.add("10.0.0.1", {"sensors.temperature": 22.0})
+    assert encoder.pop_batch() == (0, [], [(0, 0, 22.0)])
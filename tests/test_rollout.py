@@ -0,0 +1,56 @@
+"""Tests for the staged firmware rollout."""
+import asyncio
+
+from dingz.exceptions import DingzFirmwareError
+from dingz.fleet import DingzFleet
+from dingz.rollout import FirmwareRollout
+
+
+class FailingRollout(FirmwareRollout):
+    """Rollout whose upgrades fail for the given hosts."""
+
+    def __init__(self, fleet, failing, **kwargs):
+        super().__init__(fleet, "image.bin", "2.0.0", wait_for_discovery=False, **kwargs)
+        self.failing = failing
+        self.started = []
+
+    async def _upgrade(self, dingz):
+        self.started.append(dingz.host)
+        await asyncio.sleep(0.01)
+        if dingz.host in self.failing:
+            raise DingzFirmwareError("upload to %s failed" % dingz.host)
+        return True
+
+
+def rollout(hosts, failing, **kwargs):
+    """Run a rollout over ``hosts``, return it and its report."""
+
+    async def test():
+        async with DingzFleet(hosts) as fleet:
+            upgrade = FailingRollout(fleet, failing, **kwargs)
+            return upgrade, await upgrade.run()
+
+    return asyncio.run(test())
+
+
+def test_wave_halts_once_failures_exceed_the_rate():
+    """Units of a wave are not started once too many of it failed."""
+    hosts = ["10.0.0.%s" % number for number in range(10)]
+    upgrade, report = rollout(hosts, set(hosts[:5]), wave_size=10, parallelism=5)
+
+    assert upgrade.started == hosts[:5]
+    assert sorted(report.failed) == hosts[:5]
+    assert report.skipped == hosts[5:]
+    assert report.updated == []
+    assert report.halted
+
+
+def test_rollout_continues_below_the_rate():
+    """A single failure per wave does not halt the rollout."""
+    hosts = ["10.0.0.%s" % number for number in range(10)]
+    upgrade, report = rollout(hosts, {hosts[0], hosts[5]}, wave_size=5, parallelism=5)
+
+    assert upgrade.started == hosts
+    assert len(report.updated) == 8
+    assert report.skipped == []
+    assert not report.halted
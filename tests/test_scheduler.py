@@ -0,0 +1,62 @@
+"""Tests for the per-unit request scheduler."""
+import asyncio
+
+import pytest
+
+from dingz.scheduler import PRIORITY_COMMAND, PRIORITY_STATE, RequestScheduler
+
+
+def request(sent, name, delay=0.05):
+    """Return a factory for a request recording its name when sent."""
+
+    async def send():
+        sent.append(name)
+        await asyncio.sleep(delay)
+        return name
+
+    return send
+
+
+def test_queued_requests_are_sent_by_priority():
+    """Commands queued after state polls are sent first."""
+
+    async def test():
+        scheduler = RequestScheduler(max_in_flight=1)
+        sent = []
+        results = await asyncio.gather(
+            scheduler.submit(request(sent, "a")),
+            scheduler.submit(request(sent, "poll"), priority=PRIORITY_STATE),
+            scheduler.submit(request(sent, "command"), priority=PRIORITY_COMMAND),
+        )
+
+        assert sent == ["a", "command", "poll"]
+        assert results == ["a", "poll", "command"]
+
+    asyncio.run(test())
+
+
+def test_cancelled_queued_request_is_not_sent():
+    """A queued request whose caller was cancelled is dropped."""
+
+    async def test():
+        scheduler = RequestScheduler(max_in_flight=1)
+        sent = []
+        first = asyncio.ensure_future(scheduler.submit(request(sent, "a")))
+        second = asyncio.ensure_future(scheduler.submit(request(sent, "b")))
+        third = asyncio.ensure_future(scheduler.submit(request(sent, "c")))
+        await asyncio.sleep(0.01)
+        assert scheduler.queued == 2
+
+        second.cancel()
+        await asyncio.sleep(0)
+        assert scheduler.queued == 1
+        assert await first == "a"
+        assert await third == "c"
+        with pytest.raises(asyncio.CancelledError):
+            await second
+
+        assert sent == ["a", "c"]
+        assert scheduler.queued == 0
+        assert scheduler.in_flight == 0
+
+    asyncio.run(test())
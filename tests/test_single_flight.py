@@ -0,0 +1,116 @@
+"""Tests for sharing concurrent identical requests to a dingz unit."""
+import asyncio
+
+from aiohttp import web
+from yarl import URL
+
+from dingz import make_call
+from dingz.dingz import Dingz
+
+
+async def start_server(delay=0.05):
+    """Start a stand-in dingz unit, return the runner, its URL and the request counts."""
+    counts = {}
+
+    async def handler(request):
+        key = (request.method, request.path_qs, request.headers.get("Authorization"))
+        counts[key] = counts.get(key, 0) + 1
+        await asyncio.sleep(delay)
+        return web.json_response({"path": request.path, "call": counts[key]})
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, URL(f"http://127.0.0.1:{port}/api/v1/"), counts
+
+
+def run(coroutine_function):
+    """Run a test against a stand-in unit."""
+
+    async def test():
+        runner, uri, counts = await start_server()
+        try:
+            async with Dingz("127.0.0.1") as dingz:
+                dingz.uri = uri
+                await coroutine_function(dingz, counts)
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(test())
+
+
+def test_concurrent_gets_share_one_request():
+    """N concurrent identical GETs produce a single request."""
+
+    async def check(dingz, counts):
+        url = dingz.uri.join(URL("state"))
+        results = await asyncio.gather(*(make_call(dingz, uri=url) for _ in range(20)))
+
+        assert counts == {("GET", "/api/v1/state", None): 1}
+        assert all(result == results[0] for result in results)
+
+    run(check)
+
+
+def test_sequential_gets_are_not_shared():
+    """A GET after the previous one finished is sent again."""
+
+    async def check(dingz, counts):
+        url = dingz.uri.join(URL("state"))
+        await make_call(dingz, uri=url)
+        await make_call(dingz, uri=url)
+
+        assert counts == {("GET", "/api/v1/state", None): 2}
+
+    run(check)
+
+
+def test_different_tokens_are_not_shared():
+    """GETs with different tokens are sent and answered separately."""
+
+    async def check(dingz, counts):
+        url = dingz.uri.join(URL("state"))
+        # Two slots are in flight, "c" and "d" are queued in the scheduler
+        tokens = ["a", "b", "c", "d", "a"]
+        await asyncio.gather(*(make_call(dingz, uri=url, token=token) for token in tokens))
+
+        assert counts == {
+            ("GET", "/api/v1/state", "Bearer a"): 1,
+            ("GET", "/api/v1/state", "Bearer b"): 1,
+            ("GET", "/api/v1/state", "Bearer c"): 1,
+            ("GET", "/api/v1/state", "Bearer d"): 1,
+        }
+
+    run(check)
+
+
+def test_posts_are_not_shared():
+    """Commands are always sent."""
+
+    async def check(dingz, counts):
+        url = dingz.uri.join(URL("dimmer/0/on"))
+        await asyncio.gather(*(make_call(dingz, uri=url, method="POST") for _ in range(3)))
+
+        assert counts == {("POST", "/api/v1/dimmer/0/on", None): 3}
+
+    run(check)
+
+
+def test_cancelled_caller_does_not_cancel_others():
+    """Cancelling one caller leaves the shared request to the others."""
+
+    async def check(dingz, counts):
+        url = dingz.uri.join(URL("state"))
+        first = asyncio.ensure_future(make_call(dingz, uri=url))
+        second = asyncio.ensure_future(make_call(dingz, uri=url))
+        await asyncio.sleep(0.01)
+        first.cancel()
+
+        assert (await second)["path"] == "/api/v1/state"
+        assert counts == {("GET", "/api/v1/state", None): 1}
+
+    run(check)
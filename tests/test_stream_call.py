@@ -0,0 +1,90 @@
+"""Tests for streamed requests to a dingz unit."""
+import asyncio
+
+import pytest
+from aiohttp import web
+from yarl import URL
+
+from dingz import stream_call
+from dingz.dingz import Dingz
+from dingz.exceptions import DingzResponseError
+from dingz.scheduler import RequestScheduler
+
+
+async def start_server():
+    """Start a stand-in unit with a slowly streamed log, return the runner and its URL."""
+
+    async def log(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for line in range(3):
+            await response.write(b"line %d\n" % line)
+            await asyncio.sleep(0.05)
+        return response
+
+    async def info(request):
+        return web.json_response({"mac": "AABBCCDDEEFF"})
+
+    app = web.Application()
+    app.router.add_get("/log", log)
+    app.router.add_get("/api/v1/info", info)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, URL(f"http://127.0.0.1:{port}/api/v1/")
+
+
+def run(coroutine_function):
+    """Run a test against a stand-in unit allowing a single request in flight."""
+
+    async def test():
+        runner, uri = await start_server()
+        try:
+            scheduler = RequestScheduler(max_in_flight=1)
+            async with Dingz("127.0.0.1", scheduler=scheduler) as dingz:
+                dingz.uri = uri
+                await coroutine_function(dingz, scheduler)
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(test())
+
+
+def test_stream_holds_a_slot():
+    """Requests wait for a slot while a log is streamed."""
+
+    async def check(dingz, scheduler):
+        events = []
+
+        async def stream():
+            async for chunk in dingz.stream_log():
+                events.append(chunk)
+            events.append("closed")
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            assert scheduler.in_flight == 1
+            await dingz.get_info()
+            events.append("info")
+
+        await asyncio.gather(stream(), fetch())
+
+        assert events == [b"line 0\n", b"line 1\n", b"line 2\n", "closed", "info"]
+        assert scheduler.in_flight == 0
+
+    run(check)
+
+
+def test_stream_error_status():
+    """An error status is raised like for other requests and frees the slot."""
+
+    async def check(dingz, scheduler):
+        with pytest.raises(DingzResponseError):
+            async for _ in stream_call(dingz, uri=dingz.uri.join(URL("missing"))):
+                pass
+
+        assert scheduler.in_flight == 0
+
+    run(check)
@@ -0,0 +1,82 @@
+"""Tests for the asyncio streams transport."""
+import asyncio
+
+import pytest
+from yarl import URL
+
+from dingz import make_call
+from dingz.dingz import Dingz
+from dingz.exceptions import DingzConnectionError
+from dingz.transport import StreamTransport
+
+VALID = (
+    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+    b"Content-Length: 11\r\n\r\n{\"on\":true}"
+)
+
+
+async def start_server(response):
+    """Start a stand-in unit answering every request with ``response``, return its URL."""
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                await reader.readuntil(b"\r\n\r\n")
+                writer.write(response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, URL(f"http://127.0.0.1:{port}/api/v1/state")
+
+
+def call(response):
+    """Send a GET through the streams transport to a unit answering ``response``."""
+
+    async def test():
+        server, url = await start_server(response)
+        transport = StreamTransport()
+        try:
+            async with Dingz("127.0.0.1", transport=transport) as dingz:
+                return await make_call(dingz, uri=url)
+        finally:
+            await transport.close()
+            server.close()
+            await server.wait_closed()
+
+    return asyncio.run(test())
+
+
+def test_valid_response():
+    """A response with a content length is decoded."""
+    assert call(VALID) == {"on": True}
+
+
+def test_chunked_response():
+    """A chunked response is joined."""
+    response = (
+        b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+        b"Transfer-Encoding: chunked\r\n\r\n5\r\n{\"on\"\r\n6\r\n:true}\r\n0\r\n\r\n"
+    )
+    assert call(response) == {"on": True}
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        b"garbage\r\n\r\n",
+        b"HTTP/1.1 OK\r\n\r\n",
+        b"HTTP/1.1 200 OK\r\nContent-Length: many\r\n\r\n",
+        b"HTTP/1.1 200 OK\r\nContent-Length: -1\r\n\r\n",
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n",
+        b"HTTP/1.1 200 OK\r\n" + b"X" * 70000 + b"\r\n\r\n",
+    ],
+)
+def test_malformed_response(response):
+    """Malformed responses are raised as connection errors."""
+    with pytest.raises(DingzConnectionError):
+        call(response)